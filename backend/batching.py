@@ -0,0 +1,163 @@
+"""
+动态微批处理
+在一个很短的时间窗口内收集并发请求，合并成一次批量调用后再把结果分发给各个等待方
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+# handler(key, items) -> 与 items 一一对应的结果列表
+BatchHandler = Callable[[Hashable, list[Any]], Awaitable[list[Any]]]
+
+# split_on(error) -> 该错误是否可能只由批次中的个别请求引起
+SplitPredicate = Callable[[Exception], bool]
+
+
+class MicroBatcher:
+    """
+    按 key 分组的微批处理器
+
+    同一 key 的请求在 max_wait 秒内或凑满 max_batch_size 条时合并执行，
+    不同 key 的请求互不合并；批量调用失败且 split_on(错误) 为真时把批次对半拆开重试，
+    直到失败只落在出错的请求上，其余请求不受连累
+    """
+
+    def __init__(
+        self,
+        handler: BatchHandler,
+        max_batch_size: int,
+        max_wait: float,
+        split_on: SplitPredicate | None = None,
+    ):
+        self.handler = handler
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.split_on = split_on
+        self._pending: dict[Hashable, list[tuple[Any, asyncio.Future]]] = {}
+        self._timers: dict[Hashable, asyncio.TimerHandle] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self.splits = 0
+
+    async def submit(self, item: Any, key: Hashable = None) -> Any:
+        """提交单个请求并等待其所在批次的结果"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        batch = self._pending.setdefault(key, [])
+        batch.append((item, future))
+
+        if len(batch) >= self.max_batch_size or self.max_wait <= 0:
+            self._flush(key)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.max_wait, self._flush, key)
+
+        return await future
+
+    def _flush(self, key: Hashable):
+        """立即执行 key 对应的待处理批次"""
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+
+        batch = self._pending.pop(key, None)
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._run(key, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: Hashable, batch: list[tuple[Any, asyncio.Future]]):
+        """执行批量调用并分发结果"""
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        await self._execute(key, batch)
+
+    async def _execute(self, key: Hashable, batch: list[tuple[Any, asyncio.Future]]):
+        """调用 handler，失败时按 split_on 对半拆分重试"""
+        try:
+            results = await self.handler(key, [item for item, _ in batch])
+        except Exception as e:
+            if len(batch) > 1 and self.split_on and self.split_on(e):
+                self.splits += 1
+                middle = len(batch) // 2
+                await asyncio.gather(
+                    self._execute(key, batch[:middle]),
+                    self._execute(key, batch[middle:]),
+                )
+                return
+            self._fail(batch, e)
+            return
+
+        if len(results) != len(batch):
+            # 结果条数不一致时无法确定对应关系，整批失败而不是错配或让等待方一直挂起
+            self._fail(
+                batch,
+                RuntimeError(
+                    f"批量调用返回 {len(results)} 条结果，期望 {len(batch)} 条"
+                ),
+            )
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    @staticmethod
+    def _fail(batch: list[tuple[Any, asyncio.Future]], error: Exception):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def stats(self) -> dict:
+        """返回批处理统计信息"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait": self.max_wait,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "splits": self.splits,
+        }
+
+
+class SingleFlight:
+    """
+    相同 key 的并发调用只执行一次，其余调用方共享同一个结果
+
+    领头请求被取消时任务仍会继续执行，不影响其它等待方
+    """
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """执行 func，若已有相同 key 的调用在进行中则等待其结果"""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.executions += 1
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        """返回去重统计信息"""
+        total = self.executions + self.coalesced
+        return {
+            "in_flight": len(self._inflight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesce_rate": self.coalesced / total if total else 0.0,
+        }
@@ -0,0 +1,82 @@
+"""
+进程内缓存
+基于 OrderedDict 的 LRU + TTL 缓存，带命中/未命中/淘汰计数
+"""
+
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+def normalize_query(text: str) -> str:
+    """规范化查询文本：统一全半角、去除首尾空白并合并连续空白"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class LRUTTLCache:
+    """
+    有界 LRU 缓存，条目在 ttl 秒后过期
+
+    超出 max_size 时淘汰最久未使用的条目
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        """读取缓存，未命中或已过期返回 None"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        """写入缓存，必要时淘汰最久未使用的条目"""
+        if self.max_size <= 0:
+            return
+
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """清空缓存"""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """返回缓存统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
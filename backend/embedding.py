@@ -0,0 +1,117 @@
+"""
+Embedding 客户端
+在进程内复用连接池调用阿里云 DashScope Embedding API
+"""
+
+import httpx
+
+from backend.resilience import CircuitBreaker, ResilientCaller, TokenBucket
+from config import Settings
+
+
+def build_client_options(settings: Settings, timeout: float | None = None) -> dict:
+    """根据配置构建 httpx 客户端参数 (连接池、HTTP/2、保活)"""
+    return {
+        "base_url": settings.dashscope_base_url,
+        "headers": {
+            "Authorization": f"Bearer {settings.dashscope_api_key}",
+            "Content-Type": "application/json",
+        },
+        "timeout": httpx.Timeout(timeout or settings.embedding_timeout),
+        "limits": httpx.Limits(
+            max_connections=settings.embedding_max_connections,
+            max_keepalive_connections=settings.embedding_max_keepalive_connections,
+            keepalive_expiry=settings.embedding_keepalive_expiry,
+        ),
+        "http2": settings.embedding_http2,
+    }
+
+
+def build_caller(settings: Settings) -> ResilientCaller:
+    """根据配置构建导入脚本使用的限流、重试与熔断组件"""
+    return ResilientCaller(
+        limiter=TokenBucket(
+            settings.embedding_import_rate_limit, settings.embedding_rate_burst
+        ),
+        breaker=CircuitBreaker(
+            settings.embedding_breaker_threshold, settings.embedding_breaker_reset
+        ),
+        max_retries=settings.embedding_max_retries,
+        base_delay=settings.embedding_retry_base_delay,
+        max_delay=settings.embedding_retry_max_delay,
+    )
+
+
+def build_search_caller(settings: Settings) -> ResilientCaller:
+    """
+    根据配置构建后端查询使用的容错组件
+
+    令牌桶在每个 worker 进程内独立计数，限额按 worker 数平分；
+    查询有用户在等待，重试次数更少，本地限流等待与重试都不超过总时限
+    """
+    workers = settings.api_workers if settings.server_mode == "production" else 1
+    workers = max(1, workers)
+    return ResilientCaller(
+        limiter=TokenBucket(
+            settings.embedding_rate_limit / workers,
+            settings.embedding_rate_burst / workers,
+        ),
+        breaker=CircuitBreaker(
+            settings.embedding_breaker_threshold, settings.embedding_breaker_reset
+        ),
+        max_retries=settings.embedding_search_max_retries,
+        base_delay=settings.embedding_retry_base_delay,
+        max_delay=min(
+            settings.embedding_retry_max_delay, settings.embedding_search_deadline
+        ),
+        deadline=settings.embedding_search_deadline,
+    )
+
+
+def build_payload(texts: list[str], model: str) -> dict:
+    """构建 embeddings 请求体"""
+    return {"model": model, "input": texts, "encoding_format": "float"}
+
+
+def parse_embeddings(result: dict) -> list[list[float]]:
+    """解析 embeddings 响应，按 index 排序确保顺序正确"""
+    embeddings_data = sorted(result["data"], key=lambda x: x["index"])
+    return [item["embedding"] for item in embeddings_data]
+
+
+class EmbeddingClient:
+    """
+    异步 Embedding 客户端
+
+    在应用生命周期内只创建一次，所有请求共享同一个连接池，
+    避免每次查询都重新建立 TCP/TLS 连接；
+    所有请求经过同一个限流器，遇到 429/5xx 自动退避重试，持续失败时熔断
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        timeout: float | None = None,
+        caller: ResilientCaller | None = None,
+    ):
+        self.model = settings.embedding_model
+        self._client = httpx.AsyncClient(**build_client_options(settings, timeout))
+        self.caller = caller or build_caller(settings)
+
+    async def _post(self, payload: dict) -> list[list[float]]:
+        response = await self._client.post("/embeddings", json=payload)
+        response.raise_for_status()
+        return parse_embeddings(response.json())
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        """批量获取文本的 embedding"""
+        payload = build_payload(texts, self.model)
+        return await self.caller.call(lambda: self._post(payload))
+
+    def stats(self) -> dict:
+        """请求、重试、限流与熔断统计"""
+        return self.caller.stats()
+
+    async def aclose(self):
+        """关闭连接池"""
+        await self._client.aclose()
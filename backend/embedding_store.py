@@ -0,0 +1,259 @@
+"""
+持久化 Embedding 存储
+基于 SQLite (WAL 模式)，以内容哈希 + 模型 + 维度为键，
+可被多个 uvicorn worker 与导入脚本共享，重启后依然有效；
+按最近使用时间淘汰，条目数与存活时间有上限
+"""
+
+import hashlib
+import queue
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    content_hash TEXT NOT NULL,
+    model TEXT NOT NULL,
+    dimension INTEGER NOT NULL,
+    vector BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (content_hash, model, dimension)
+) WITHOUT ROWID
+"""
+
+_INDEX = "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+
+# 命中的条目距上次使用超过该时间 (秒) 才更新 last_used，避免每次读取都写库
+_TOUCH_INTERVAL = 3600.0
+
+# 两次淘汰检查的最小间隔 (秒)
+_PRUNE_INTERVAL = 60.0
+
+# 后台写入线程的退出信号
+_STOP = object()
+
+
+def content_hash(text: str) -> str:
+    """计算文本内容哈希"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _encode(vector: list[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _decode(blob: bytes) -> list[float]:
+    return array("f", blob).tolist()
+
+
+class EmbeddingStore:
+    """
+    SQLite 持久化 embedding 缓存
+
+    读取在调用线程中完成 (每个线程独立连接，close 时统一关闭)；
+    put_async 写入后台线程批量提交，不占用请求路径。
+    写入后定期淘汰：超过 ttl 秒未使用的条目，以及超出 max_rows 的最久未使用条目
+    (对所有模型与维度合计；0 表示不限制)
+    """
+
+    def __init__(
+        self,
+        path: str,
+        model: str,
+        dimension: int,
+        max_rows: int = 0,
+        ttl: float = 0,
+    ):
+        self.path = Path(path)
+        self.model = model
+        self.dimension = dimension
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue()
+        self._writer: threading.Thread | None = None
+        self._pruned_at = float("-inf")
+
+        conn = self._connect()
+        conn.execute(_SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(embeddings)")}
+        if "last_used" not in columns:
+            # 旧版本创建的库没有 last_used，以写入时间作为最近使用时间
+            conn.execute(
+                "ALTER TABLE embeddings ADD COLUMN last_used REAL NOT NULL DEFAULT 0"
+            )
+            conn.execute("UPDATE embeddings SET last_used = created_at")
+        conn.execute(_INDEX)
+        conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # 连接只在创建它的线程中使用，关闭时由 close 统一处理
+            conn = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def get(self, text: str) -> list[float] | None:
+        """读取单条文本的 embedding，不存在返回 None"""
+        return self.get_many([text]).get(text)
+
+    def get_many(self, texts: list[str]) -> dict[str, list[float]]:
+        """批量读取，返回 {文本: embedding}，仅包含已存储的条目"""
+        if not texts:
+            return {}
+
+        hashes = {content_hash(text): text for text in texts}
+        conn = self._connect()
+        found: dict[str, list[float]] = {}
+        now = time.time()
+        stale: list[str] = []
+
+        keys = list(hashes)
+        # SQLite 单条语句的参数数量有限，分批查询
+        for i in range(0, len(keys), 500):
+            chunk = keys[i : i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT content_hash, vector, last_used FROM embeddings "
+                f"WHERE model = ? AND dimension = ? "
+                f"AND content_hash IN ({placeholders})",
+                (self.model, self.dimension, *chunk),
+            ).fetchall()
+            for digest, blob, last_used in rows:
+                found[hashes[digest]] = _decode(blob)
+                if now - last_used >= _TOUCH_INTERVAL:
+                    stale.append(digest)
+
+        if stale:
+            self._touch(conn, stale, now)
+        return found
+
+    def _touch(self, conn: sqlite3.Connection, hashes: list[str], now: float):
+        """更新命中条目的最近使用时间 (失败不影响读取结果)"""
+        try:
+            conn.executemany(
+                "UPDATE embeddings SET last_used = ? "
+                "WHERE content_hash = ? AND model = ? AND dimension = ?",
+                [(now, digest, self.model, self.dimension) for digest in hashes],
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"Embedding 持久化更新使用时间失败: {e}")
+
+    def put_many(self, items: list[tuple[str, list[float]]]):
+        """同步批量写入 (导入脚本使用)"""
+        if not items:
+            return
+
+        now = time.time()
+        conn = self._connect()
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (content_hash(text), self.model, self.dimension, _encode(vec), now, now)
+                for text, vec in items
+            ],
+        )
+        conn.commit()
+
+        if time.monotonic() - self._pruned_at >= _PRUNE_INTERVAL:
+            self.prune()
+
+    def prune(self) -> int:
+        """淘汰过期与超出条目数上限的条目，返回删除的条数"""
+        self._pruned_at = time.monotonic()
+        conn = self._connect()
+        removed = 0
+        if self.ttl > 0:
+            removed += conn.execute(
+                "DELETE FROM embeddings WHERE last_used < ?",
+                (time.time() - self.ttl,),
+            ).rowcount
+        if self.max_rows > 0:
+            (total,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if total > self.max_rows:
+                removed += conn.execute(
+                    "DELETE FROM embeddings WHERE (content_hash, model, dimension) IN "
+                    "(SELECT content_hash, model, dimension FROM embeddings "
+                    "ORDER BY last_used LIMIT ?)",
+                    (total - self.max_rows,),
+                ).rowcount
+        conn.commit()
+        return removed
+
+    def put_async(self, text: str, vector: list[float]):
+        """异步写入：放入队列后立即返回，由后台线程批量提交"""
+        if self._writer is None:
+            self._writer = threading.Thread(
+                target=self._write_loop, name="embedding-store-writer", daemon=True
+            )
+            self._writer.start()
+        self._queue.put((text, vector))
+
+    def _write_loop(self):
+        """后台写入线程：尽量合并队列中的待写条目后一次提交"""
+        try:
+            stop = False
+            while not stop:
+                pending = []
+                item = self._queue.get()
+                while item is not _STOP:
+                    pending.append(item)
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                stop = item is _STOP
+
+                try:
+                    self.put_many(pending)
+                except sqlite3.Error as e:
+                    print(f"Embedding 持久化写入失败: {e}")
+        finally:
+            self._close_local()
+
+    def count(self) -> int:
+        """当前模型与维度下已存储的条目数"""
+        conn = self._connect()
+        (total,) = conn.execute(
+            "SELECT COUNT(*) FROM embeddings WHERE model = ? AND dimension = ?",
+            (self.model, self.dimension),
+        ).fetchone()
+        return total
+
+    def close(self):
+        """等待后台写入完成并关闭所有线程 (包括 to_thread 线程池) 打开的连接"""
+        if self._writer is not None:
+            self._queue.put(_STOP)
+            self._writer.join()
+            self._writer = None
+
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    def _close_local(self):
+        """关闭当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            with self._lock:
+                self._connections.remove(conn)
+            conn.close()
+            self._local.conn = None
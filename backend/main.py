@@ -3,32 +3,66 @@ FastAPI 后端服务
 提供语义搜索 API
 """
 
+import asyncio
+import json
 import sys
 from pathlib import Path
 from contextlib import asynccontextmanager
 
 import httpx
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, TypeAdapter
 from pymilvus import MilvusClient
 
 # 添加项目根目录到 Python 路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from config import get_settings
+from backend.batching import MicroBatcher, SingleFlight
+from backend.cache import LRUTTLCache, normalize_query
+from backend.embedding import EmbeddingClient, build_search_caller
+from backend.embedding_store import EmbeddingStore
+from backend.milvus import AsyncMilvus, CollectionState, SearchCoalescer
+from backend.rerank import COARSE_FIELD, rerank, truncate
+from backend.resilience import (
+    CircuitOpenError,
+    DeadlineExceededError,
+    is_request_error,
+)
+from backend.vector_index import search_params
 
 # 全局变量
-milvus_client: MilvusClient | None = None
+milvus_client: AsyncMilvus | None = None
+search_coalescer: SearchCoalescer | None = None
+collection_state: CollectionState | None = None
+embedding_client: EmbeddingClient | None = None
+embedding_batcher: MicroBatcher | None = None
+embedding_store: EmbeddingStore | None = None
 settings = get_settings()
+search_flight = SingleFlight()
+embedding_cache = LRUTTLCache(
+    max_size=settings.embedding_cache_size, ttl=settings.embedding_cache_ttl
+)
+search_cache = LRUTTLCache(
+    max_size=settings.search_cache_size, ttl=settings.search_cache_ttl
+)
+
+# Milvus 单次搜索的 limit 上限为 16384，两阶段检索的候选数 top_k × oversample 也不能超过
+MILVUS_MAX_LIMIT = 16384
+MAX_TOP_K = 1000
+MAX_OVERSAMPLE = 16
 
 
 class SearchRequest(BaseModel):
     """搜索请求模型"""
 
     query: str
-    top_k: int = 10
+    top_k: int = Field(10, ge=1, le=MAX_TOP_K)
     book_filter: str | None = None  # 可选的书籍过滤
+    two_stage: bool | None = None  # 两阶段检索，默认 SEARCH_TWO_STAGE
+    # 粗排候选倍数，默认 SEARCH_OVERSAMPLE
+    oversample: int | None = Field(None, ge=1, le=MAX_OVERSAMPLE)
 
 
 class SearchResult(BaseModel):
@@ -47,51 +81,219 @@ class SearchResponse(BaseModel):
     query: str
 
 
+class BatchSearchRequest(BaseModel):
+    """批量搜索请求模型"""
+
+    queries: list[SearchRequest]
+
+
+class BatchSearchItem(BaseModel):
+    """批量搜索中单条查询的结果，失败时 error 非空"""
+
+    query: str
+    results: list[SearchResult] = []
+    error: str | None = None
+
+
+class BatchSearchResponse(BaseModel):
+    """批量搜索响应模型，顺序与请求一致"""
+
+    results: list[BatchSearchItem]
+
+
+search_results_adapter = TypeAdapter(list[SearchResult])
+
+# Milvus 搜索参数 (与配置的索引类型匹配) 与输出字段
+SEARCH_PARAMS = search_params(settings.milvus_index_type, settings.milvus_search_params)
+OUTPUT_FIELDS = ["content", "page", "book"]
+
+
+def search_response_bytes(results_json: bytes, query: str) -> Response:
+    """将已序列化的结果列表拼装为 SearchResponse JSON，无需重建 pydantic 对象"""
+    query_json = json.dumps(query, ensure_ascii=False).encode("utf-8")
+    return Response(
+        content=b'{"results":' + results_json + b',"query":' + query_json + b"}",
+        media_type="application/json",
+    )
+
+
+def embedding_cache_key(normalized: str) -> tuple:
+    """查询 embedding 的缓存键"""
+    return (normalized, settings.embedding_model, settings.embedding_dimension)
+
+
 async def get_embedding(text: str) -> list[float]:
     """
     获取文本的 embedding
-    使用阿里云 DashScope API
+    使用阿里云 DashScope API，复用生命周期内的共享连接池
+    依次查询进程内缓存与持久化缓存，均未命中时才调用 API；
+    规范化文本只用作缓存键，发送给 API 的是去除首尾空白的原文
+    (与导入时一样不改动标点，保证查询向量与库中向量一致)
     """
-    url = "https://dashscope.aliyuncs.com/compatible-mode/v1/embeddings"
-
-    headers = {
-        "Authorization": f"Bearer {settings.dashscope_api_key}",
-        "Content-Type": "application/json",
-    }
-
-    data = {
-        "model": settings.embedding_model,
-        "input": [text],
-        "encoding_format": "float",
-    }
-
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        result = response.json()
+    normalized = normalize_query(text)
+    cache_key = embedding_cache_key(normalized)
+    cached = embedding_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    if embedding_store:
+        stored = await asyncio.to_thread(embedding_store.get, normalized)
+        if stored is not None:
+            embedding_cache.set(cache_key, stored)
+            return stored
+
+    if not embedding_batcher:
+        raise RuntimeError("Embedding 客户端未初始化")
+
+    # 与同一时间窗口内的其它查询合并为一次批量调用
+    embedding = await embedding_batcher.submit(text.strip())
+    embedding_cache.set(cache_key, embedding)
+    if embedding_store:
+        embedding_store.put_async(normalized, embedding)
+    return embedding
+
+
+async def get_embeddings(texts: list[str]) -> dict[str, list[float] | Exception]:
+    """
+    批量获取多条文本的 embedding
+    去重并跳过已缓存的文本后，按单次 API 调用的上限分批并发请求
 
-    return result["data"][0]["embedding"]
+    返回 {规范化文本: embedding}，调用失败的文本对应异常对象；
+    某批因 4xx 失败时逐条重试，只有出错的文本对应异常；
+    规范化文本相同的查询只请求一次，发送的是其中第一条的原文 (去除首尾空白)
+    """
+    if not embedding_client:
+        raise RuntimeError("Embedding 客户端未初始化")
+
+    originals: dict[str, str] = {}
+    for text in texts:
+        originals.setdefault(normalize_query(text), text.strip())
+
+    embeddings: dict[str, list[float] | Exception] = {}
+    missing = []
+    for normalized in originals:
+        cached = embedding_cache.get(embedding_cache_key(normalized))
+        if cached is not None:
+            embeddings[normalized] = cached
+        else:
+            missing.append(normalized)
+
+    if missing and embedding_store:
+        stored = await asyncio.to_thread(embedding_store.get_many, missing)
+        for normalized, embedding in stored.items():
+            embedding_cache.set(embedding_cache_key(normalized), embedding)
+        embeddings.update(stored)
+        missing = [text for text in missing if text not in stored]
+
+    async def embed_chunk(chunk: list[str]) -> list[list[float] | Exception]:
+        try:
+            outcome = await embedding_client.embed_batch(
+                [originals[normalized] for normalized in chunk]
+            )
+        except Exception as e:
+            if len(chunk) == 1 or not is_request_error(e):
+                return [e] * len(chunk)
+            # 个别文本导致整批被拒绝，逐条重试找出出错的文本
+            singles = await asyncio.gather(
+                *(embed_chunk([normalized]) for normalized in chunk)
+            )
+            return [result for single in singles for result in single]
+        if len(outcome) != len(chunk):
+            error = RuntimeError(
+                f"API 返回 {len(outcome)} 条结果，期望 {len(chunk)} 条"
+            )
+            return [error] * len(chunk)
+        return outcome
+
+    batch_size = max(1, settings.embedding_batch_max_size)
+    chunks = [missing[i : i + batch_size] for i in range(0, len(missing), batch_size)]
+    outcomes = await asyncio.gather(*(embed_chunk(chunk) for chunk in chunks))
+
+    for chunk, outcome in zip(chunks, outcomes):
+        for normalized, embedding in zip(chunk, outcome):
+            embeddings[normalized] = embedding
+            if isinstance(embedding, Exception):
+                continue
+            embedding_cache.set(embedding_cache_key(normalized), embedding)
+            if embedding_store:
+                embedding_store.put_async(normalized, embedding)
+
+    return embeddings
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
-    global milvus_client
+    global milvus_client, search_coalescer, collection_state
+    global embedding_client, embedding_batcher, embedding_store
+
+    # 启动时创建 Embedding 客户端 (共享连接池)
+    embedding_client = EmbeddingClient(
+        settings,
+        timeout=min(settings.embedding_timeout, settings.embedding_search_deadline),
+        caller=build_search_caller(settings),
+    )
+    embedding_batcher = MicroBatcher(
+        lambda _, texts: embedding_client.embed_batch(texts),
+        max_batch_size=settings.embedding_batch_max_size,
+        max_wait=settings.embedding_batch_window,
+        split_on=is_request_error,
+    )
+
+    # 打开持久化 Embedding 缓存 (多 worker 共享)
+    if settings.embedding_store_path:
+        embedding_store = EmbeddingStore(
+            settings.embedding_store_path,
+            settings.embedding_model,
+            settings.embedding_dimension,
+            max_rows=settings.embedding_store_max_rows,
+            ttl=settings.embedding_store_ttl,
+        )
 
     # 启动时连接 Milvus
     print(f"正在连接 Zilliz Cloud: {settings.zilliz_cloud_uri}")
-    milvus_client = MilvusClient(
-        uri=settings.zilliz_cloud_uri, token=settings.zilliz_cloud_token
+    milvus_client = AsyncMilvus(
+        MilvusClient(uri=settings.zilliz_cloud_uri, token=settings.zilliz_cloud_token),
+        max_workers=settings.milvus_max_concurrency,
+    )
+    search_coalescer = SearchCoalescer(
+        milvus_client,
+        max_batch_size=settings.milvus_batch_max_size,
+        max_wait=settings.milvus_batch_window,
     )
     print("Milvus 连接成功")
 
+    # 读取别名指向的集合 (结果缓存的版本号与向量精度)，之后定期刷新
+    collection_state = CollectionState(
+        milvus_client,
+        settings.milvus_collection_name,
+        settings.milvus_refresh_interval,
+        vector_dtype=settings.milvus_vector_dtype,
+    )
+    await collection_state.refresh()
+    refresh_task = (
+        asyncio.create_task(collection_state.run())
+        if settings.milvus_refresh_interval > 0
+        else None
+    )
+
     yield
 
+    if refresh_task:
+        refresh_task.cancel()
+
     # 关闭时断开连接
     if milvus_client:
         milvus_client.close()
         print("Milvus 连接已关闭")
 
+    if embedding_client:
+        await embedding_client.aclose()
+        print("Embedding 客户端已关闭")
+
+    if embedding_store:
+        embedding_store.close()
+
 
 # 创建 FastAPI 应用
 app = FastAPI(
@@ -117,6 +319,99 @@ async def health_check():
     return {"status": "healthy"}
 
 
+def build_filter(book_filter: str | None) -> str:
+    """
+    构建过滤条件
+
+    书名是分区键时，Milvus 根据 book == "..." 条件只搜索该书所在的分区，
+    书名按 JSON 字符串转义，避免引号等字符破坏表达式
+    """
+    if book_filter:
+        return f"book == {json.dumps(book_filter, ensure_ascii=False)}"
+    return ""
+
+
+def resolve_two_stage(request: SearchRequest) -> tuple[bool, int]:
+    """请求的两阶段检索设置 (未指定时使用配置)，返回 (是否启用, 粗排候选倍数)"""
+    two_stage = (
+        settings.search_two_stage if request.two_stage is None else request.two_stage
+    )
+    if two_stage and not collection_state.coarse_dimension:
+        raise ValueError(
+            f"集合 {collection_state.name} 没有粗排向量字段，不能使用两阶段检索"
+        )
+    oversample = (
+        settings.search_oversample if request.oversample is None else request.oversample
+    )
+    if oversample < 1:
+        raise ValueError("oversample 必须大于 0")
+    return two_stage, oversample
+
+
+def hits_to_results(hits: list[dict]) -> list[SearchResult]:
+    """将 Milvus 命中结果格式化为 SearchResult"""
+    search_results = []
+    for hit in hits:
+        search_results.append(
+            SearchResult(
+                content=hit["entity"]["content"],
+                page=hit["entity"]["page"],
+                book=hit["entity"]["book"],
+                score=hit["distance"],  # COSINE 相似度
+            )
+        )
+    return search_results
+
+
+def describe_error(e: Exception) -> str:
+    """将异常转换为与 /search 一致的错误描述"""
+    if isinstance(e, (httpx.HTTPError, CircuitOpenError, DeadlineExceededError)):
+        return f"Embedding API 调用失败: {str(e)}"
+    return f"搜索失败: {str(e)}"
+
+
+async def search_hits(
+    query: str,
+    top_k: int,
+    book_filter: str | None,
+    two_stage: bool = False,
+    oversample: int = 1,
+) -> list[SearchResult]:
+    """执行一次完整的检索流程：获取 embedding 并在 Milvus 中搜索"""
+    # 获取查询文本的 embedding
+    query_embedding = await get_embedding(query)
+    vector_dtype = collection_state.vector_dtype
+    coarse_dimension = collection_state.coarse_dimension
+
+    if two_stage:
+        # 低维字段上取 top_k × oversample 个候选，再用全维向量重排
+        coarse = truncate([query_embedding], coarse_dimension)
+        hits = await search_coalescer.search(
+            collection_name=settings.milvus_collection_name,
+            vector=coarse[0].tolist(),
+            limit=min(top_k * oversample, MILVUS_MAX_LIMIT),
+            filter=build_filter(book_filter),
+            search_params=SEARCH_PARAMS,
+            output_fields=OUTPUT_FIELDS + ["embedding"],
+            anns_field=COARSE_FIELD,
+            vector_dtype=vector_dtype,
+        )
+        return hits_to_results(rerank(query_embedding, hits, top_k, vector_dtype))
+
+    # 在 Milvus 中搜索 (与并发的同类查询合并为一次多向量搜索)
+    hits = await search_coalescer.search(
+        collection_name=settings.milvus_collection_name,
+        vector=query_embedding,
+        limit=top_k,
+        filter=build_filter(book_filter),
+        search_params=SEARCH_PARAMS,
+        output_fields=OUTPUT_FIELDS,
+        vector_dtype=vector_dtype,
+    )
+
+    return hits_to_results(hits)
+
+
 @app.post("/search", response_model=SearchResponse)
 async def search(request: SearchRequest):
     """
@@ -124,61 +419,201 @@ async def search(request: SearchRequest):
 
     根据用户输入查找最匹配的文本段落
     """
-    if not milvus_client:
+    if not search_coalescer:
         raise HTTPException(status_code=503, detail="Milvus 服务未连接")
 
     if not request.query.strip():
         raise HTTPException(status_code=400, detail="查询内容不能为空")
 
     try:
-        # 获取查询文本的 embedding
-        query_embedding = await get_embedding(request.query)
-
-        # 构建过滤条件
-        filter_expr = ""
-        if request.book_filter:
-            filter_expr = f'book == "{request.book_filter}"'
-
-        # 在 Milvus 中搜索
-        search_params = {"metric_type": "COSINE", "params": {"nprobe": 10}}
+        two_stage, oversample = resolve_two_stage(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 结果缓存键包含集合版本号，切换别名或增量导入后旧结果自动失效
+    cache_key = (
+        normalize_query(request.query),
+        request.top_k,
+        request.book_filter,
+        (two_stage, oversample) if two_stage else None,
+        collection_state.version,
+    )
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return search_response_bytes(cached, request.query)
 
-        results = milvus_client.search(
-            collection_name=settings.milvus_collection_name,
-            data=[query_embedding],
-            limit=request.top_k,
-            output_fields=["content", "page", "book"],
-            filter=filter_expr if filter_expr else None,
-            search_params=search_params,
+    async def run_search() -> bytes:
+        search_results = await search_hits(
+            request.query, request.top_k, request.book_filter, two_stage, oversample
         )
+        results_json = search_results_adapter.dump_json(search_results)
+        search_cache.set(cache_key, results_json)
+        return results_json
 
-        # 格式化结果
-        search_results = []
-        for hits in results:
-            for hit in hits:
-                search_results.append(
-                    SearchResult(
-                        content=hit["entity"]["content"],
-                        page=hit["entity"]["page"],
-                        book=hit["entity"]["book"],
-                        score=hit["distance"],  # COSINE 相似度
-                    )
-                )
-
-        return SearchResponse(results=search_results, query=request.query)
+    try:
+        # 完全相同的并发查询只执行一次检索流程，共享结果
+        results_json = await search_flight.do(cache_key, run_search)
+
+        return search_response_bytes(results_json, request.query)
 
     except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"Embedding API 调用失败: {str(e)}")
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=f"Embedding API 暂不可用: {str(e)}")
+    except DeadlineExceededError as e:
+        raise HTTPException(status_code=504, detail=f"Embedding API 调用超时: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"搜索失败: {str(e)}")
 
 
+@app.post("/search/batch", response_model=BatchSearchResponse)
+async def search_batch(request: BatchSearchRequest):
+    """
+    批量语义搜索接口
+
+    一次请求提交多条查询：embedding 按 API 上限合并调用，
+    过滤条件与检索方式相同的查询合并为一次多向量 Milvus 搜索；
+    单条查询失败时在对应条目的 error 中返回，不影响其它查询
+    """
+    if not milvus_client:
+        raise HTTPException(status_code=503, detail="Milvus 服务未连接")
+
+    if len(request.queries) > settings.search_batch_max_queries:
+        raise HTTPException(
+            status_code=400,
+            detail=f"单次最多提交 {settings.search_batch_max_queries} 条查询",
+        )
+
+    items = [BatchSearchItem(query=q.query) for q in request.queries]
+
+    # 获取所有非空查询的 embedding
+    valid = []
+    modes: dict[int, tuple[bool, int]] = {}
+    for i, q in enumerate(request.queries):
+        if not q.query.strip():
+            items[i].error = "查询内容不能为空"
+            continue
+        try:
+            modes[i] = resolve_two_stage(q)
+        except ValueError as e:
+            items[i].error = str(e)
+            continue
+        valid.append(i)
+
+    embeddings = await get_embeddings([request.queries[i].query for i in valid])
+    vector_dtype = collection_state.vector_dtype
+    coarse_dimension = collection_state.coarse_dimension
+
+    # 按过滤条件与是否两阶段检索分组，每组一次多向量搜索
+    groups: dict[tuple[str, bool], list[tuple[int, list[float]]]] = {}
+    for i in valid:
+        q = request.queries[i]
+        embedding = embeddings[normalize_query(q.query)]
+        if isinstance(embedding, Exception):
+            items[i].error = describe_error(embedding)
+            continue
+        key = (build_filter(q.book_filter), modes[i][0])
+        groups.setdefault(key, []).append((i, embedding))
+
+    def candidates(i: int) -> int:
+        """第 i 条查询需要的命中数 (两阶段检索为粗排候选数)"""
+        two_stage, oversample = modes[i]
+        if not two_stage:
+            return request.queries[i].top_k
+        return min(request.queries[i].top_k * oversample, MILVUS_MAX_LIMIT)
+
+    async def search_group(
+        key: tuple[str, bool], members: list[tuple[int, list[float]]]
+    ):
+        filter_expr, two_stage = key
+        data = [embedding for _, embedding in members]
+        if two_stage:
+            data = truncate(data, coarse_dimension).tolist()
+        return await milvus_client.search(
+            collection_name=settings.milvus_collection_name,
+            data=data,
+            anns_field=COARSE_FIELD if two_stage else "embedding",
+            limit=max(candidates(i) for i, _ in members),
+            output_fields=OUTPUT_FIELDS + (["embedding"] if two_stage else []),
+            filter=filter_expr,
+            search_params=SEARCH_PARAMS,
+            vector_dtype=vector_dtype,
+        )
+
+    async def search_members(
+        key: tuple[str, bool], members: list[tuple[int, list[float]]]
+    ) -> list[list[dict] | Exception]:
+        try:
+            return list(await search_group(key, members))
+        except Exception as e:
+            if len(members) == 1:
+                return [e]
+            # 合并搜索失败时逐条重试，只让出错的查询失败
+            outcomes = await asyncio.gather(
+                *(search_group(key, [member]) for member in members),
+                return_exceptions=True,
+            )
+            return [
+                outcome if isinstance(outcome, Exception) else outcome[0]
+                for outcome in outcomes
+            ]
+
+    outcomes = await asyncio.gather(
+        *(search_members(key, members) for key, members in groups.items())
+    )
+
+    for ((_, two_stage), members), outcome in zip(groups.items(), outcomes):
+        for (i, embedding), hits in zip(members, outcome):
+            if isinstance(hits, Exception):
+                items[i].error = describe_error(hits)
+                continue
+            hits = list(hits)[: candidates(i)]
+            top_k = request.queries[i].top_k
+            if two_stage:
+                hits = rerank(embedding, hits, top_k, vector_dtype)
+            items[i].results = hits_to_results(hits[:top_k])
+
+    return BatchSearchResponse(results=items)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """查询缓存统计信息"""
+    stats = {
+        "embedding": embedding_cache.stats(),
+        "search": {
+            **search_cache.stats(),
+            "collection_version": (
+                collection_state.version if collection_state else None
+            ),
+        },
+    }
+    if embedding_store:
+        stats["embedding_store"] = {
+            "path": str(embedding_store.path),
+            "size": await asyncio.to_thread(embedding_store.count),
+        }
+    return stats
+
+
+@app.get("/metrics")
+async def metrics():
+    """批处理等运行时指标"""
+    return {
+        "embedding_client": embedding_client.stats() if embedding_client else None,
+        "embedding_batcher": embedding_batcher.stats() if embedding_batcher else None,
+        "milvus_search_batcher": search_coalescer.stats() if search_coalescer else None,
+        "search_single_flight": search_flight.stats(),
+    }
+
+
 @app.get("/collections")
 async def list_collections():
     """列出所有集合"""
     if not milvus_client:
         raise HTTPException(status_code=503, detail="Milvus 服务未连接")
 
-    collections = milvus_client.list_collections()
+    collections = await milvus_client.list_collections()
     return {"collections": collections}
 
 
@@ -189,18 +624,42 @@ async def collection_stats(collection_name: str):
         raise HTTPException(status_code=503, detail="Milvus 服务未连接")
 
     try:
-        stats = milvus_client.get_collection_stats(collection_name)
+        stats = await milvus_client.get_collection_stats(collection_name)
         return stats
     except Exception as e:
         raise HTTPException(status_code=404, detail=f"集合不存在或获取失败: {str(e)}")
 
 
 def start_server():
-    """启动服务器"""
+    """
+    启动服务器
+
+    development 模式：单进程，监听文件变化自动重载
+    production 模式：多 worker 进程 + uvloop/httptools，
+    收到 SIGTERM 后停止接收新连接，并在 api_graceful_timeout 秒内处理完进行中的请求
+    """
     import uvicorn
 
+    if settings.server_mode != "production":
+        uvicorn.run(
+            "backend.main:app",
+            host=settings.api_host,
+            port=settings.api_port,
+            reload=True,
+        )
+        return
+
+    print(f"以生产模式启动: {settings.api_workers} 个 worker")
     uvicorn.run(
-        "backend.main:app", host=settings.api_host, port=settings.api_port, reload=True
+        "backend.main:app",
+        host=settings.api_host,
+        port=settings.api_port,
+        workers=settings.api_workers,
+        loop=settings.api_loop,
+        http=settings.api_http,
+        backlog=settings.api_backlog,
+        timeout_keep_alive=settings.api_keepalive_timeout,
+        timeout_graceful_shutdown=settings.api_graceful_timeout,
     )
 
 
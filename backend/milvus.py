@@ -0,0 +1,215 @@
+"""
+Milvus 异步访问层
+MilvusClient 的调用都是阻塞的 gRPC 请求，这里统一放到有界线程池中执行，
+避免阻塞事件循环
+"""
+
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+from pymilvus import DataType, MilvusClient, MilvusException
+
+from backend.batching import MicroBatcher
+from backend.rerank import COARSE_FIELD
+from backend.vector_index import VECTOR_DTYPES, check_vector_dtype, encode_queries
+
+# 集合属性中的内容版本号，导入脚本每次原地修改集合 (增量导入) 后更新
+VERSION_PROPERTY = "classic_index.version"
+
+
+class AsyncMilvus:
+    """将 MilvusClient 的阻塞调用包装为协程，并发度由线程池大小限制"""
+
+    def __init__(self, client: MilvusClient, max_workers: int = 16):
+        self.client = client
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="milvus"
+        )
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """在线程池中执行任意阻塞调用"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, partial(func, *args, **kwargs)
+        )
+
+    async def search(self, vector_dtype: str = "float32", **kwargs) -> list[list[dict]]:
+        """向量搜索，查询向量按集合向量字段的存储精度 vector_dtype 整批编码后发送"""
+        if vector_dtype != "float32":
+            kwargs["data"] = encode_queries(kwargs["data"], vector_dtype)
+        return await self.run(self.client.search, **kwargs)
+
+    async def list_collections(self) -> list[str]:
+        """列出所有集合"""
+        return await self.run(self.client.list_collections)
+
+    async def get_collection_stats(self, collection_name: str) -> dict:
+        """获取集合统计信息"""
+        return await self.run(self.client.get_collection_stats, collection_name)
+
+    def close(self):
+        """关闭线程池与底层连接"""
+        self._executor.shutdown(wait=True)
+        self.client.close()
+
+
+def schema_vector_dtype(description: dict, field_name: str = "embedding") -> str:
+    """从集合描述 (describe_collection) 读取向量字段的存储精度"""
+    for field in description["fields"]:
+        if field["name"] == field_name:
+            for vector_dtype, (field_type, _) in VECTOR_DTYPES.items():
+                if field["type"] == DataType[field_type]:
+                    return vector_dtype
+    raise RuntimeError(f"集合 {description['collection_name']} 的向量字段类型不受支持")
+
+
+def schema_coarse_dimension(description: dict) -> int:
+    """集合描述中粗排向量字段的维度，没有该字段时返回 0"""
+    for field in description["fields"]:
+        if field["name"] == COARSE_FIELD:
+            return int(field["params"]["dim"])
+    return 0
+
+
+def bump_version(client: MilvusClient, collection_name: str) -> str | None:
+    """
+    为别名 (或集合名) 当前指向的物理集合写入新的内容版本号
+
+    失败时只打印警告：别名切换仍会使后端缓存失效，但原地修改的结果要等缓存过期
+    """
+    version = str(time.time_ns())
+    try:
+        target = client.describe_collection(collection_name)["collection_name"]
+        client.alter_collection_properties(
+            target, properties={VERSION_PROPERTY: version}
+        )
+    except MilvusException as e:
+        print(f"警告: 写入集合版本号失败，旧的搜索缓存要等过期后才会失效: {e}")
+        return None
+    return version
+
+
+class CollectionState:
+    """
+    线上集合状态
+
+    定期读取别名当前指向的物理集合及其版本属性，二者共同组成结果缓存的版本号：
+    全量导入切换别名或增量导入更新属性后，旧缓存自动失效，
+    导入脚本与后端不需要共享任何文件。
+    向量字段的存储精度与粗排字段的维度同样以集合 schema 为准，
+    切换到不同 schema 的集合后随之更新；读取失败时保留上一次的状态
+    (首次读取前使用配置的精度，不启用两阶段检索)
+    """
+
+    def __init__(
+        self,
+        milvus: AsyncMilvus,
+        alias: str,
+        refresh_interval: float,
+        vector_dtype: str = "float32",
+    ):
+        self.milvus = milvus
+        self.alias = alias
+        self.refresh_interval = refresh_interval
+        self.name = alias
+        self.version = "0"
+        self.vector_dtype = check_vector_dtype(vector_dtype)
+        self.coarse_dimension = 0
+
+    async def refresh(self):
+        """重新读取集合描述"""
+        try:
+            description = await self.milvus.run(
+                self.milvus.client.describe_collection, self.alias
+            )
+            vector_dtype = schema_vector_dtype(description)
+        except Exception as e:
+            print(f"读取集合 {self.alias} 状态失败: {e}")
+            return
+
+        self.name = description["collection_name"]
+        self.vector_dtype = vector_dtype
+        self.coarse_dimension = schema_coarse_dimension(description)
+        properties = description.get("properties") or {}
+        self.version = f"{self.name}:{properties.get(VERSION_PROPERTY, '0')}"
+
+    async def run(self):
+        """后台循环，每 refresh_interval 秒刷新一次"""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.refresh()
+
+
+class SearchCoalescer:
+    """
+    Milvus 搜索合并器
+
+    将集合、向量字段、过滤条件、搜索参数和输出字段都相同的并发搜索合并为一次
+    多向量 (nq > 1) 搜索，再按调用方拆分结果；
+    top_k 不同的请求按最大值搜索后各自截断；
+    合并搜索失败时拆开重试，个别调用方的参数问题 (如 limit 超限) 不会连累其它调用方
+    """
+
+    def __init__(self, milvus: AsyncMilvus, max_batch_size: int, max_wait: float):
+        self.milvus = milvus
+        self.batcher = MicroBatcher(
+            self._search_batch,
+            max_batch_size=max_batch_size,
+            max_wait=max_wait,
+            split_on=lambda e: isinstance(e, MilvusException),
+        )
+
+    async def search(
+        self,
+        collection_name: str,
+        vector: list[float],
+        limit: int,
+        filter: str = "",
+        search_params: dict | None = None,
+        output_fields: list[str] | None = None,
+        anns_field: str = "embedding",
+        vector_dtype: str = "float32",
+    ) -> list[dict]:
+        """搜索单个向量，返回该向量的命中列表"""
+        key = (
+            collection_name,
+            anns_field,
+            vector_dtype,
+            filter,
+            json.dumps(search_params or {}, sort_keys=True),
+            tuple(output_fields or ()),
+        )
+        return await self.batcher.submit((vector, limit), key=key)
+
+    async def _search_batch(
+        self, key: tuple, items: list[tuple[list[float], int]]
+    ) -> list[list[dict]]:
+        """执行合并后的多向量搜索并按调用方拆分"""
+        (
+            collection_name,
+            anns_field,
+            vector_dtype,
+            filter,
+            params_json,
+            output_fields,
+        ) = key
+        results = await self.milvus.search(
+            collection_name=collection_name,
+            data=[vector for vector, _ in items],
+            anns_field=anns_field,
+            limit=max(limit for _, limit in items),
+            output_fields=list(output_fields),
+            filter=filter,
+            search_params=json.loads(params_json),
+            vector_dtype=vector_dtype,
+        )
+        return [list(hits)[:limit] for hits, (_, limit) in zip(results, items)]
+
+    def stats(self) -> dict:
+        """返回合并统计信息"""
+        return self.batcher.stats()
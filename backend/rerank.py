@@ -0,0 +1,41 @@
+"""
+两阶段检索 (Matryoshka)
+text-embedding-v4 的向量前缀本身就是有效的低维表示：导入时把全维向量截断为低维并重新归一化，
+存为单独的粗排字段；搜索时先在低维字段上取 top_k × oversample 个候选，
+再用候选的全维向量精确计算余弦相似度重排，只在少量候选上付出全维计算的代价
+"""
+
+import numpy as np
+
+from backend.vector_index import decode_vectors
+
+# 低维粗排向量字段
+COARSE_FIELD = "embedding_coarse"
+
+
+def truncate(vectors: list | np.ndarray, dimension: int) -> np.ndarray:
+    """整批截取向量前 dimension 维并重新归一化 (余弦相似度需要单位向量)"""
+    matrix = np.asarray(vectors, dtype=np.float32)[:, :dimension]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def rerank(
+    query: list[float], hits: list[dict], top_k: int, vector_dtype: str = "float32"
+) -> list[dict]:
+    """
+    用全维向量对粗排候选重新打分，返回按余弦相似度降序的前 top_k 条
+
+    候选的 entity 中需要包含 embedding 字段；返回的命中 distance 替换为全维相似度
+    """
+    if not hits:
+        return []
+    candidates = decode_vectors(
+        [hit["entity"]["embedding"] for hit in hits], vector_dtype
+    )
+    scores = candidates @ np.asarray(query, dtype=np.float32)
+    scores /= np.maximum(
+        np.linalg.norm(candidates, axis=1) * np.linalg.norm(query), 1e-12
+    )
+    order = np.argsort(-scores)[:top_k]
+    return [{**hits[i], "distance": float(scores[i])} for i in order]
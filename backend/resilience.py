@@ -0,0 +1,314 @@
+"""
+外部 API 调用的容错层
+令牌桶限流、带抖动的指数退避重试 (遵循 Retry-After) 与熔断器，
+后端查询与数据导入共用
+"""
+
+import asyncio
+import email.utils
+import random
+import time
+from typing import Awaitable, Callable, TypeVar
+
+import httpx
+
+T = TypeVar("T")
+
+# 可重试的 HTTP 状态码：限流与服务端临时错误
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被直接拒绝"""
+
+
+class DeadlineExceededError(Exception):
+    """调用 (含限流等待) 超出总时限"""
+
+
+def is_request_error(error: Exception) -> bool:
+    """是否为不可重试的 4xx 错误 (请求本身有误，批量请求中可能只是个别输入的问题)"""
+    return (
+        isinstance(error, httpx.HTTPStatusError)
+        and error.response.status_code not in RETRYABLE_STATUS
+    )
+
+
+class TokenBucket:
+    """
+    异步令牌桶限流器
+
+    以 rate 个/秒的速度补充令牌，最多积累 capacity 个；rate <= 0 表示不限流
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+        self.acquired = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self):
+        """获取一个令牌，令牌不足或处于暂停期时等待"""
+        if self.rate <= 0 and not self._paused_until:
+            self.acquired += 1
+            return
+
+        start = time.monotonic()
+        # 串行等待，保证先到的请求先拿到令牌
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                if self.rate <= 0:
+                    break
+
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    break
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+        waited = time.monotonic() - start
+        self.acquired += 1
+        if waited > 0.001:
+            self.waits += 1
+            self.wait_time += waited
+
+    def pause(self, seconds: float):
+        """服务端要求降速时暂停发放令牌，所有调用方一起等待"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+        self._updated = time.monotonic()
+
+    def stats(self) -> dict:
+        """限流统计"""
+        return {
+            "rate": self.rate,
+            "capacity": self.capacity,
+            "acquired": self.acquired,
+            "waits": self.waits,
+            "wait_time": round(self.wait_time, 3),
+        }
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    连续失败 failure_threshold 次后打开，reset_timeout 秒内直接拒绝请求；
+    之后进入半开状态放行一个探测请求，成功则关闭，失败则重新打开
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+        self.opens = 0
+        self.rejections = 0
+
+    def before_call(self):
+        """调用前检查，熔断时抛出 CircuitOpenError"""
+        if self.failure_threshold <= 0 or self.state == "closed":
+            return
+
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                self.rejections += 1
+                raise CircuitOpenError("Embedding API 连续失败，已熔断")
+            self.state = "half_open"
+
+        # 半开状态只放行一个探测请求
+        if self._probing:
+            self.rejections += 1
+            raise CircuitOpenError("Embedding API 熔断恢复中")
+        self._probing = True
+
+    def release(self):
+        """调用未产生结果 (如被取消) 时归还探测名额"""
+        self._probing = False
+
+    def record_success(self):
+        self._failures = 0
+        self._probing = False
+        self.state = "closed"
+
+    def record_failure(self):
+        self._failures += 1
+        self._probing = False
+        if self.state == "half_open" or (
+            self.failure_threshold > 0 and self._failures >= self.failure_threshold
+        ):
+            if self.state != "open":
+                self.opens += 1
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        """熔断统计"""
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "opens": self.opens,
+            "rejections": self.rejections,
+        }
+
+
+def parse_retry_after(response: httpx.Response) -> float | None:
+    """解析 Retry-After 响应头 (秒数或 HTTP 日期)"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class ResilientCaller:
+    """
+    限流 + 重试 + 熔断
+
+    429 视为限流：遵循 Retry-After 暂停整个令牌桶，不计入熔断失败，
+    Retry-After 超过 max_delay 时不再重试；
+    5xx 与网络错误按带抖动的指数退避重试，并计入熔断失败；
+    其他 4xx 属于请求本身的问题，直接抛出；
+    deadline > 0 时，等待令牌超出从首次调用算起的总时限则抛出 DeadlineExceededError，
+    等待后重试会超出总时限则不再重试
+    """
+
+    def __init__(
+        self,
+        limiter: TokenBucket,
+        breaker: CircuitBreaker,
+        max_retries: int,
+        base_delay: float,
+        max_delay: float,
+        deadline: float = 0,
+    ):
+        self.limiter = limiter
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.throttled = 0
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次重试前的等待时间 (full jitter)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    async def call(self, func: Callable[[], Awaitable[T]]) -> T:
+        """执行一次带容错的调用，func 每次重试都会被重新调用"""
+        self.calls += 1
+        attempt = 0
+        start = time.monotonic()
+
+        while True:
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                self.failures += 1
+                raise
+            try:
+                async with asyncio.timeout(
+                    start + self.deadline - time.monotonic() if self.deadline else None
+                ):
+                    await self.limiter.acquire()
+            except TimeoutError:
+                self.breaker.release()
+                self.failures += 1
+                raise DeadlineExceededError(
+                    f"等待限流超出总时限 {self.deadline:g} 秒"
+                ) from None
+            except BaseException:
+                self.breaker.release()
+                raise
+
+            try:
+                result = await func()
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code
+                if status not in RETRYABLE_STATUS:
+                    # 请求本身有误，不影响熔断状态
+                    self.breaker.record_success()
+                    self.failures += 1
+                    raise
+
+                delay = self.backoff(attempt)
+                if status == 429:
+                    self.throttled += 1
+                    self.breaker.record_success()
+                    retry_after = parse_retry_after(e.response)
+                    if retry_after is not None:
+                        # 等满服务端要求的时间，超过 max_delay 时在下面放弃重试
+                        delay = retry_after
+                    self.limiter.pause(delay)
+                else:
+                    self.breaker.record_failure()
+                error = e
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                delay = self.backoff(attempt)
+                error = e
+            except BaseException:
+                # 非 API 错误 (如任务被取消) 不改变熔断状态
+                self.breaker.release()
+                raise
+            else:
+                self.breaker.record_success()
+                self.successes += 1
+                return result
+
+            if (
+                attempt >= self.max_retries
+                or delay > self.max_delay
+                or (self.deadline and time.monotonic() + delay - start > self.deadline)
+            ):
+                self.failures += 1
+                raise error
+
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        """调用统计"""
+        return {
+            "calls": self.calls,
+            "successes": self.successes,
+            "failures": self.failures,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "limiter": self.limiter.stats(),
+            "circuit_breaker": self.breaker.stats(),
+        }
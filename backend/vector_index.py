@@ -0,0 +1,148 @@
+"""
+向量索引配置
+集中管理索引类型、构建参数与对应的搜索参数，导入脚本建索引和后端搜索共用，
+保证搜索时发送的参数与实际的索引类型匹配；
+向量字段的存储精度 (float32 / float16 / bfloat16) 及其编解码也在这里
+"""
+
+import ml_dtypes
+import numpy as np
+
+# 向量相似度度量 (搜索结果的 score 按余弦相似度解释，越大越相似)
+METRIC_TYPE = "COSINE"
+
+# 各索引类型的默认构建参数，未在配置中指定时使用
+DEFAULT_BUILD_PARAMS: dict[str, dict] = {
+    "AUTOINDEX": {},
+    "FLAT": {},
+    "HNSW": {"M": 16, "efConstruction": 200},
+    "IVF_FLAT": {"nlist": 1024},
+    "IVF_SQ8": {"nlist": 1024},
+    "IVF_PQ": {"nlist": 1024, "m": 64, "nbits": 8},
+    "DISKANN": {},
+    "SCANN": {"nlist": 1024, "with_raw_data": True},
+}
+
+# 各索引类型的默认搜索参数
+DEFAULT_SEARCH_PARAMS: dict[str, dict] = {
+    "AUTOINDEX": {},
+    "FLAT": {},
+    "HNSW": {"ef": 64},
+    "IVF_FLAT": {"nprobe": 16},
+    "IVF_SQ8": {"nprobe": 16},
+    "IVF_PQ": {"nprobe": 16},
+    "DISKANN": {"search_list": 100},
+    "SCANN": {"nprobe": 16, "reorder_k": 100},
+}
+
+
+def check_index_type(index_type: str) -> str:
+    """规范化并校验索引类型"""
+    index_type = index_type.upper()
+    if index_type not in DEFAULT_BUILD_PARAMS:
+        raise ValueError(
+            f"不支持的索引类型 {index_type}，可选: {', '.join(DEFAULT_BUILD_PARAMS)}"
+        )
+    return index_type
+
+
+def build_params(index_type: str, params: dict | None = None) -> dict:
+    """索引构建参数：默认值与配置合并，配置优先"""
+    index_type = check_index_type(index_type)
+    return {**DEFAULT_BUILD_PARAMS[index_type], **(params or {})}
+
+
+def search_params(index_type: str, params: dict | None = None) -> dict:
+    """与索引类型匹配的搜索参数 (MilvusClient.search 的 search_params)"""
+    index_type = check_index_type(index_type)
+    return {
+        "metric_type": METRIC_TYPE,
+        "params": {**DEFAULT_SEARCH_PARAMS[index_type], **(params or {})},
+    }
+
+
+# 向量字段的存储精度: 字段类型与每个维度占用的字节数
+VECTOR_DTYPES: dict[str, tuple[str, int]] = {
+    "float32": ("FLOAT_VECTOR", 4),
+    "float16": ("FLOAT16_VECTOR", 2),
+    "bfloat16": ("BFLOAT16_VECTOR", 2),
+}
+
+
+def check_vector_dtype(vector_dtype: str) -> str:
+    """规范化并校验向量存储精度"""
+    vector_dtype = vector_dtype.lower()
+    if vector_dtype not in VECTOR_DTYPES:
+        raise ValueError(
+            f"不支持的向量精度 {vector_dtype}，可选: {', '.join(VECTOR_DTYPES)}"
+        )
+    return vector_dtype
+
+
+def to_bfloat16_bits(matrix: np.ndarray) -> np.ndarray:
+    """
+    float32 矩阵转为 bfloat16 的位模式 (uint16)
+
+    bfloat16 即 float32 的高 16 位，这里按最近偶数舍入截断，
+    NaN/Inf 不会出现在归一化的 embedding 中，不做特殊处理
+    """
+    bits = np.ascontiguousarray(matrix, dtype=np.float32).view(np.uint32)
+    rounding = np.uint32(0x7FFF) + ((bits >> 16) & 1)
+    return ((bits + rounding) >> 16).astype(np.uint16)
+
+
+def encode_vectors(vectors: list | np.ndarray, vector_dtype: str) -> list:
+    """
+    整批向量转为写入时使用的格式
+
+    float32 原样返回；半精度先整体转换为 [行数, 维度] 矩阵，
+    再按行切成小端字节串 (写入时 pymilvus 按集合 schema 识别字节串的向量类型)
+    """
+    vector_dtype = check_vector_dtype(vector_dtype)
+    if vector_dtype == "float32":
+        return vectors
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if vector_dtype == "float16":
+        encoded = matrix.astype("<f2")
+    else:
+        encoded = to_bfloat16_bits(matrix).astype("<u2", copy=False)
+    return [row.tobytes() for row in encoded]
+
+
+def encode_queries(vectors: list | np.ndarray, vector_dtype: str) -> list:
+    """
+    整批查询向量转为搜索时使用的格式
+
+    搜索请求中的字节串会被 pymilvus 2.x 当作二值向量，
+    半精度查询向量按行转为对应 dtype 的 NumPy 数组，由数组类型决定占位符类型
+    """
+    vector_dtype = check_vector_dtype(vector_dtype)
+    if vector_dtype == "float32":
+        return vectors
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if vector_dtype == "float16":
+        encoded = matrix.astype(np.float16)
+    else:
+        encoded = to_bfloat16_bits(matrix).view(ml_dtypes.bfloat16)
+    return list(encoded)
+
+
+def decode_vectors(values: list, vector_dtype: str) -> np.ndarray:
+    """把 query 返回的向量字段 (浮点列表、半精度数组或字节串) 转回 float32 矩阵"""
+    vector_dtype = check_vector_dtype(vector_dtype)
+    if vector_dtype == "float32":
+        return np.asarray(values, dtype=np.float32)
+
+    rows = []
+    for value in values:
+        # 部分 pymilvus 版本把半精度向量包在单元素列表中返回
+        if isinstance(value, list) and len(value) == 1:
+            value = value[0]
+        if isinstance(value, bytes):
+            if vector_dtype == "float16":
+                value = np.frombuffer(value, dtype="<f2")
+            else:
+                bits = np.frombuffer(value, dtype="<u2").astype(np.uint32) << 16
+                value = bits.view(np.float32)
+        rows.append(np.asarray(value, dtype=np.float32))
+    return np.stack(rows) if rows else np.empty((0, 0), dtype=np.float32)
@@ -0,0 +1,99 @@
+"""
+Embedding 客户端基准测试
+对比每次请求新建 httpx.AsyncClient 与共享连接池 EmbeddingClient 的 p50/p99 延迟
+
+用法: python -m benchmarks.bench_embedding_client --requests 500 --concurrency 10
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import get_settings
+from backend.embedding import EmbeddingClient, build_payload
+from benchmarks.mock_dashscope import MockServer
+from benchmarks.utils import format_latency
+
+
+async def embed_with_fresh_client(base_url: str, model: str, text: str):
+    """旧实现：每次请求新建并关闭客户端"""
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        response = await client.post(
+            f"{base_url}/embeddings", json=build_payload([text], model)
+        )
+        response.raise_for_status()
+        return response.json()["data"][0]["embedding"]
+
+
+async def run_load(call, total: int, concurrency: int) -> list[float]:
+    """以固定并发度执行 total 次调用，返回每次调用的耗时"""
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await call(f"查询文本 {i}")
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return latencies
+
+
+async def run_benchmark(args):
+    settings = get_settings().model_copy(
+        update={
+            "dashscope_base_url": args.base_url,
+            "dashscope_api_key": "bench",
+            # 只比较连接复用，不启用限流
+            "embedding_import_rate_limit": 0,
+        }
+    )
+
+    before = await run_load(
+        lambda text: embed_with_fresh_client(
+            settings.dashscope_base_url, settings.embedding_model, text
+        ),
+        args.requests,
+        args.concurrency,
+    )
+
+    client = EmbeddingClient(settings)
+    try:
+        after = await run_load(
+            lambda text: client.embed_batch([text]), args.requests, args.concurrency
+        )
+    finally:
+        await client.aclose()
+
+    print(format_latency("before (新建客户端)", before))
+    print(format_latency("after (共享连接池)", after))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding 客户端延迟基准测试")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.02, help="模拟服务延迟 (秒)")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--base-url", default="", help="指定已有的服务地址")
+    args = parser.parse_args()
+
+    if args.base_url:
+        asyncio.run(run_benchmark(args))
+        return
+
+    with MockServer(port=args.port, latency=args.latency) as server:
+        args.base_url = server.base_url
+        asyncio.run(run_benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
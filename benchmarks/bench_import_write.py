@@ -0,0 +1,134 @@
+"""
+Milvus 写入吞吐基准测试
+对比旧的写入方式 (建集合时即建索引，每次 upsert 10 行)、大批量 insert、
+以及大批量 insert + 写完后统一建索引的写入耗时、含索引构建的总耗时和行/秒
+
+Milvus Lite 为单机嵌入式实现，索引构建特性与分布式 Milvus / Zilliz Cloud 不同，
+延迟建索引的收益应以 --real 的结果为准
+
+默认使用 Milvus Lite 本地文件 (pip install milvus-lite)，无需外部服务:
+    python -m benchmarks.bench_import_write --rows 20000
+    python -m benchmarks.bench_import_write --real               # 使用 .env 中的 Zilliz 集群
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from pymilvus import MilvusClient
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import get_settings
+from scripts.import_data import build_index, create_collection
+
+
+def make_rows(count: int, dimension: int) -> list[dict]:
+    """生成与导入脚本字段一致的随机行"""
+    rng = random.Random(42)
+    return [
+        {
+            "id": i,
+            "embedding": [rng.uniform(-1.0, 1.0) for _ in range(dimension)],
+            "content": f"第 {i} 页的示例内容，" * 20,
+            "page": str(i),
+            "book": "基准测试",
+            "content_hash": f"{i:064x}",
+        }
+        for i in range(count)
+    ]
+
+
+def wait_for_index(client: MilvusClient, collection_name: str):
+    """等待所有数据段的索引构建完成，两种方式都计入索引耗时才公平"""
+    while True:
+        index = client.describe_index(collection_name, "embedding")
+        if index.get("state") == "Finished" and not index.get("pending_index_rows"):
+            return
+        time.sleep(0.05)
+
+
+def run_case(
+    client: MilvusClient,
+    name: str,
+    rows: list[dict],
+    dimension: int,
+    batch_size: int,
+    deferred_index: bool,
+    write_mode: str,
+) -> tuple[float, float]:
+    """返回 (写入耗时, 写入 + 建索引总耗时)"""
+    collection_name = f"bench_import_{name}"
+    create_collection(client, collection_name, dimension, with_index=not deferred_index)
+    write = getattr(client, write_mode)
+
+    start = time.perf_counter()
+    for i in range(0, len(rows), batch_size):
+        write(collection_name, rows[i : i + batch_size])
+    write_elapsed = time.perf_counter() - start
+
+    client.flush(collection_name)
+    build_index(client, collection_name)
+    wait_for_index(client, collection_name)
+    total_elapsed = time.perf_counter() - start
+
+    client.drop_collection(collection_name)
+    return write_elapsed, total_elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Milvus 写入吞吐基准测试")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=1024)
+    parser.add_argument("--batch-size", type=int, default=2000, help="新方式每批行数")
+    parser.add_argument("--real", action="store_true", help="连接真实 Zilliz 集群")
+    args = parser.parse_args()
+
+    if args.real:
+        settings = get_settings()
+        client = MilvusClient(
+            uri=settings.zilliz_cloud_uri, token=settings.zilliz_cloud_token
+        )
+    else:
+        client = MilvusClient(str(Path(tempfile.mkdtemp()) / "bench.db"))
+
+    rows = make_rows(args.rows, args.dimension)
+    cases = [
+        ("before", 10, False, "upsert", "建集合即建索引，每批 upsert 10 行"),
+        (
+            "batched",
+            args.batch_size,
+            False,
+            "insert",
+            f"建集合即建索引，每批 insert {args.batch_size} 行",
+        ),
+        (
+            "after",
+            args.batch_size,
+            True,
+            "insert",
+            f"延迟建索引，每批 insert {args.batch_size} 行",
+        ),
+    ]
+
+    print(
+        f"{args.rows} 行，维度 {args.dimension}，{'Zilliz' if args.real else 'Milvus Lite'}"
+    )
+    for name, batch_size, deferred_index, write_mode, description in cases:
+        write_elapsed, total_elapsed = run_case(
+            client, name, rows, args.dimension, batch_size, deferred_index, write_mode
+        )
+        print(
+            f"{name:<8} {description:<30} 写入 {write_elapsed:6.1f}s  "
+            f"含建索引 {total_elapsed:6.1f}s  {args.rows / total_elapsed:8.0f} 行/秒"
+        )
+
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Milvus 并发基准测试
+对比在事件循环中直接调用阻塞 search 与通过 AsyncMilvus 线程池调用时，
+吞吐量随并发查询数的变化
+
+用法:
+    python -m benchmarks.bench_milvus_concurrency                # 模拟 Milvus (固定延迟)
+    python -m benchmarks.bench_milvus_concurrency --real         # 使用 .env 中的 Zilliz 集群
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import get_settings
+from backend.milvus import AsyncMilvus
+
+
+class SlowMilvusClient:
+    """模拟 MilvusClient：search 阻塞固定时长，其余方法为空操作"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def search(self, data: list, limit: int = 10, **kwargs) -> list[list[dict]]:
+        time.sleep(self.latency)
+        return [[] for _ in data]
+
+    def close(self):
+        pass
+
+
+async def measure(search, total: int, concurrency: int, dimension: int) -> float:
+    """以给定并发度执行 total 次搜索，返回每秒查询数"""
+    semaphore = asyncio.Semaphore(concurrency)
+    vector = [random.random() for _ in range(dimension)]
+
+    async def one():
+        async with semaphore:
+            await search(vector)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return total / (time.perf_counter() - start)
+
+
+async def run_benchmark(args, client):
+    settings = get_settings()
+    search_kwargs = {
+        "collection_name": settings.milvus_collection_name,
+        "limit": 10,
+        "output_fields": ["page", "book"],
+    }
+
+    async def blocking_search(vector):
+        # 旧实现：直接在协程里调用阻塞方法
+        return client.search(data=[vector], **search_kwargs)
+
+    async_milvus = AsyncMilvus(client, max_workers=args.max_workers)
+
+    async def pooled_search(vector):
+        return await async_milvus.search(data=[vector], **search_kwargs)
+
+    print(f"{'并发':>6} {'blocking qps':>14} {'thread pool qps':>16}")
+    for concurrency in args.concurrency:
+        blocking = await measure(
+            blocking_search, args.requests, concurrency, settings.embedding_dimension
+        )
+        pooled = await measure(
+            pooled_search, args.requests, concurrency, settings.embedding_dimension
+        )
+        print(f"{concurrency:>6} {blocking:>14.1f} {pooled:>16.1f}")
+
+    async_milvus.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Milvus 并发吞吐基准测试")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32]
+    )
+    parser.add_argument("--max-workers", type=int, default=16, help="线程池大小")
+    parser.add_argument("--latency", type=float, default=0.02, help="模拟搜索延迟 (秒)")
+    parser.add_argument("--real", action="store_true", help="连接真实 Zilliz 集群")
+    args = parser.parse_args()
+
+    if args.real:
+        from pymilvus import MilvusClient
+
+        settings = get_settings()
+        client = MilvusClient(
+            uri=settings.zilliz_cloud_uri, token=settings.zilliz_cloud_token
+        )
+    else:
+        client = SlowMilvusClient(args.latency)
+
+    asyncio.run(run_benchmark(args, client))
+
+
+if __name__ == "__main__":
+    main()
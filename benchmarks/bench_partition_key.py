@@ -0,0 +1,173 @@
+"""
+按书过滤的搜索延迟随书籍数量的变化
+每本书的页数固定，书籍数量逐级增加 (库随之变大)，分别用普通集合和以书名为分区键的集合
+(MILVUS_BOOK_PARTITIONS) 测量带 book == "..." 过滤条件的单查询 p50/p99，
+不带过滤的全库搜索作为参照
+
+普通集合的过滤搜索要在全库上计算过滤条件，延迟随书籍数量增长；
+分区键集合只搜索该书所在的分区，延迟应基本只取决于单个分区的大小
+
+默认使用 Milvus Lite 本地文件，--real 在 .env 中的集群上创建并删除临时集合，
+结论应以 --real 的结果为准
+
+用法:
+    python -m benchmarks.bench_partition_key --books 10 50 200 --pages-per-book 200
+    python -m benchmarks.bench_partition_key --books 100 500 --partitions 64 --real
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from pymilvus import MilvusClient
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import get_settings
+from backend.vector_index import search_params
+from benchmarks.bench_import_write import wait_for_index
+from benchmarks.tune_index import make_vectors
+from benchmarks.utils import percentile
+from scripts.import_data import build_index, create_collection
+
+COLLECTION_NAME = "bench_partition_key"
+
+
+def book_name(index: int) -> str:
+    """第 index 本测试书的书名"""
+    return f"测试书{index:05d}"
+
+
+def load_data(
+    client: MilvusClient,
+    corpus: np.ndarray,
+    books: int,
+    partitions: int,
+    batch_size: int,
+) -> None:
+    """创建临时集合 (partitions > 0 时书名为分区键)，按行号轮流分配书名写入后建索引"""
+    settings = get_settings()
+    create_collection(
+        client,
+        COLLECTION_NAME,
+        corpus.shape[1],
+        with_index=False,
+        book_partitions=partitions,
+    )
+    for start in range(0, len(corpus), batch_size):
+        client.insert(
+            COLLECTION_NAME,
+            [
+                {
+                    "id": start + i,
+                    "embedding": vector.tolist(),
+                    "content": "",
+                    "page": str((start + i) // books),
+                    "book": book_name((start + i) % books),
+                    "content_hash": "",
+                }
+                for i, vector in enumerate(corpus[start : start + batch_size])
+            ],
+        )
+    build_index(
+        client,
+        COLLECTION_NAME,
+        settings.milvus_index_type,
+        settings.milvus_index_params,
+    )
+    wait_for_index(client, COLLECTION_NAME)
+
+
+def measure(
+    client: MilvusClient, queries: np.ndarray, books: int, k: int, filtered: bool
+) -> list[float]:
+    """逐条查询 (nq=1)，过滤时每条查询随机选一本书，返回每条查询的延迟"""
+    settings = get_settings()
+    params = search_params(settings.milvus_index_type, settings.milvus_search_params)
+    rng = np.random.default_rng(0)
+    targets = [book_name(i) for i in rng.integers(0, books, len(queries))]
+
+    def search(vector: list[float], book: str) -> list[dict]:
+        expr = f"book == {json.dumps(book, ensure_ascii=False)}" if filtered else ""
+        return client.search(
+            COLLECTION_NAME,
+            [vector],
+            limit=k,
+            filter=expr,
+            output_fields=["book"],
+            search_params=params,
+        )[0]
+
+    vectors = queries.tolist()
+    for vector, book in zip(vectors[:10], targets):
+        search(vector, book)
+
+    latencies: list[float] = []
+    for vector, book in zip(vectors, targets):
+        start = time.perf_counter()
+        hits = search(vector, book)
+        latencies.append(time.perf_counter() - start)
+        if filtered and any(hit["entity"]["book"] != book for hit in hits):
+            raise RuntimeError(f"过滤结果中出现了其他书籍的页面 ({book})")
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按书过滤的搜索延迟随书籍数量的变化")
+    parser.add_argument(
+        "--books", type=int, nargs="+", default=[10, 50, 200], help="书籍数量"
+    )
+    parser.add_argument("--pages-per-book", type=int, default=200)
+    parser.add_argument("--dimension", type=int, default=128, help="随机向量维度")
+    parser.add_argument("--partitions", type=int, default=64, help="分区键集合的分区数")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--real", action="store_true", help="连接真实 Zilliz 集群")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    if args.real:
+        client = MilvusClient(
+            uri=settings.zilliz_cloud_uri, token=settings.zilliz_cloud_token
+        )
+    else:
+        client = MilvusClient(str(Path(tempfile.mkdtemp()) / "partition.db"))
+
+    print(
+        f"每本书 {args.pages_per_book} 页，维度 {args.dimension}，"
+        f"索引 {settings.milvus_index_type}，分区键集合 {args.partitions} 个分区\n"
+    )
+    print(
+        f"{'书籍数':>6} {'总行数':>8}  {'集合':<8} {'全库 p50':>10} "
+        f"{'过滤 p50':>10} {'过滤 p99':>10}"
+    )
+    try:
+        for books in args.books:
+            corpus, queries = make_vectors(
+                books * args.pages_per_book, args.queries, args.dimension
+            )
+            for name, partitions in (("普通", 0), ("分区键", args.partitions)):
+                load_data(client, corpus, books, partitions, args.batch_size)
+                unfiltered = measure(client, queries, books, args.top_k, False)
+                filtered = measure(client, queries, books, args.top_k, True)
+                client.drop_collection(COLLECTION_NAME)
+                print(
+                    f"{books:>6} {len(corpus):>8}  {name:<8} "
+                    f"{percentile(unfiltered, 50) * 1000:8.2f}ms "
+                    f"{percentile(filtered, 50) * 1000:8.2f}ms "
+                    f"{percentile(filtered, 99) * 1000:8.2f}ms"
+                )
+    finally:
+        if client.has_collection(COLLECTION_NAME):
+            client.drop_collection(COLLECTION_NAME)
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
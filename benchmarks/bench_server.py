@@ -0,0 +1,82 @@
+"""
+后端服务吞吐量基准测试
+对一个已启动的后端实例发起固定并发的 HTTP 压测，输出 QPS 与 p50/p99 延迟
+
+用法:
+    # 终端 1: 以开发模式或生产模式启动后端
+    SERVER_MODE=development python -m backend.main
+    SERVER_MODE=production API_WORKERS=4 python -m backend.main
+
+    # 终端 2: 压测
+    python -m benchmarks.bench_server --url http://localhost:8000 --path /health
+    python -m benchmarks.bench_server --path /search --query "劳动价值"
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.utils import format_latency
+
+
+async def run_benchmark(args):
+    limits = httpx.Limits(max_connections=args.concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async with httpx.AsyncClient(
+        base_url=args.url, limits=limits, timeout=30.0
+    ) as client:
+
+        async def request():
+            if args.path.startswith("/search"):
+                return await client.post(
+                    args.path, json={"query": args.query, "top_k": args.top_k}
+                )
+            return await client.get(args.path)
+
+        # 预热，建立连接
+        await asyncio.gather(*(request() for _ in range(args.concurrency)))
+
+        deadline = time.perf_counter() + args.duration
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await request()
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+    print(f"{args.url}{args.path} 并发={args.concurrency} 时长={elapsed:.1f}s")
+    print(f"QPS={len(latencies) / elapsed:.1f} 错误={errors}")
+    print(format_latency("latency", latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后端服务吞吐量基准测试")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--path", default="/health")
+    parser.add_argument("--query", default="劳动价值", help="/search 使用的查询")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=15.0, help="压测时长 (秒)")
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
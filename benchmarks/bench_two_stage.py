@@ -0,0 +1,267 @@
+"""
+两阶段检索 (Matryoshka) 对比
+低维粗排取 top_k × oversample 个候选，再用全维向量重排，与直接全维搜索对比
+粗排索引的向量数据量、recall@k 损失与单查询延迟 (EMBEDDING_COARSE_DIMENSION / SEARCH_OVERSAMPLE 配置)
+
+默认离线运行：粗排与重排都用精确计算，得到截断维度与候选倍数本身带来的召回率损失；
+--milvus 时在 Milvus Lite 中为每个粗排维度建一个临时集合 (索引类型与参数取当前配置)，
+测量全维搜索与两阶段检索的 recall@k 和 p50/p99，--real 改用 .env 中的集群
+
+随机向量按维度衰减缩放，模拟 Matryoshka 模型信息集中在前缀维度的特点，
+衰减速度只是假设，应以 embedding 快照 (--snapshot) 的结果为准
+
+用法:
+    python -m benchmarks.bench_two_stage --rows 20000
+    python -m benchmarks.bench_two_stage --snapshot .cache/snapshots/classic_books_v20250101120000
+    python -m benchmarks.bench_two_stage --snapshot ... --dimensions 256 --milvus
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from pymilvus import MilvusClient
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import get_settings
+from backend.rerank import COARSE_FIELD, rerank, truncate
+from backend.vector_index import search_params
+from benchmarks.bench_import_write import wait_for_index
+from benchmarks.bench_vector_dtype import recall_at_k
+from benchmarks.tune_index import load_snapshot, make_vectors
+from benchmarks.utils import percentile
+from scripts.ground_truth import exact_top_k, normalize
+from scripts.import_data import build_index, create_collection
+
+COLLECTION_NAME = "bench_two_stage"
+
+
+def make_matryoshka_vectors(
+    rows: int, queries: int, dimension: int, decay: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """聚簇随机向量的第 j 维乘以 (1 + j / decay)^-1，越靠后的维度携带的信息越少"""
+    corpus, query_vectors = make_vectors(rows, queries, dimension)
+    scale = 1 / (1 + np.arange(dimension, dtype=np.float32) / decay)
+    return normalize(corpus * scale), normalize(query_vectors * scale)
+
+
+def exact_two_stage(
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    dimension: int,
+    k: int,
+    oversample: int,
+) -> np.ndarray:
+    """精确粗排取 k × oversample 个候选，再用全维余弦相似度重排，返回 top-k 行号"""
+    candidates = exact_top_k(
+        truncate(corpus, dimension), truncate(queries, dimension), k * oversample
+    )
+    # [查询数, 候选数] 的全维相似度 (库与查询均已归一化)
+    scores = np.einsum("qcd,qd->qc", corpus[candidates], queries)
+    order = np.argsort(-scores, axis=1)[:, :k]
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def offline_report(
+    corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, args
+) -> None:
+    """各粗排维度与候选倍数下的索引向量数据量、单次搜索与加载内存的变化及 recall@k"""
+    rows, full_dimension = corpus.shape
+    print(
+        f"{'粗排维度':<10} {'索引向量数据':>6} {'单次搜索':>4} {'加载内存':>4} "
+        + " ".join(f"{'x' + str(n):>8}" for n in args.oversample)
+    )
+    print(
+        f"{full_dimension:<14} {rows * full_dimension * 4 / 1024**2:>9.1f} MB "
+        f"{0:>+8.0%} {0:>+8.0%} " + " ".join(f"{1:>8.4f}" for _ in args.oversample)
+    )
+    for dimension in args.dimensions:
+        recalls = [
+            recall_at_k(
+                exact_two_stage(corpus, queries, dimension, args.top_k, n), truth
+            )
+            for n in args.oversample
+        ]
+        print(
+            f"{dimension:<14} {rows * dimension * 4 / 1024**2:>9.1f} MB "
+            f"{dimension / full_dimension - 1:>+8.0%} "
+            f"{dimension / full_dimension:>+8.0%} "
+            + " ".join(f"{recall:>8.4f}" for recall in recalls)
+        )
+    print(
+        f"(x 列为对应候选倍数下的 recall@{args.top_k}，基准为全维精确搜索；"
+        "单次搜索为粗排遍历的向量数据相对全维的变化，加载内存为同时保存两个字段后的净增加)"
+    )
+
+
+def load_data(
+    client: MilvusClient, corpus: np.ndarray, dimension: int, batch_size: int
+) -> None:
+    """创建带粗排字段的临时集合、写入向量并按当前配置建索引"""
+    settings = get_settings()
+    create_collection(
+        client,
+        COLLECTION_NAME,
+        corpus.shape[1],
+        with_index=False,
+        coarse_dimension=dimension,
+    )
+    for start in range(0, len(corpus), batch_size):
+        chunk = corpus[start : start + batch_size]
+        coarse = truncate(chunk, dimension)
+        client.insert(
+            COLLECTION_NAME,
+            [
+                {
+                    "id": start + i,
+                    "embedding": vector.tolist(),
+                    COARSE_FIELD: coarse_vector.tolist(),
+                    "content": "",
+                    "page": "",
+                    "book": "",
+                    "content_hash": "",
+                }
+                for i, (vector, coarse_vector) in enumerate(zip(chunk, coarse))
+            ],
+        )
+    build_index(
+        client,
+        COLLECTION_NAME,
+        settings.milvus_index_type,
+        settings.milvus_index_params,
+    )
+    wait_for_index(client, COLLECTION_NAME)
+
+
+def measure(
+    client: MilvusClient,
+    queries: np.ndarray,
+    truth: np.ndarray,
+    k: int,
+    dimension: int,
+    oversample: int,
+) -> tuple[float, list[float]]:
+    """
+    逐条查询 (nq=1)，返回 (平均 recall@k, 每条查询的延迟)
+
+    oversample 为 0 时直接搜索全维字段，否则两阶段检索 (延迟包含重排)
+    """
+    settings = get_settings()
+    params = search_params(settings.milvus_index_type, settings.milvus_search_params)
+    coarse = truncate(queries, dimension).tolist()
+
+    def search(i: int) -> list[dict]:
+        if not oversample:
+            return client.search(
+                COLLECTION_NAME,
+                [queries[i].tolist()],
+                anns_field="embedding",
+                limit=k,
+                search_params=params,
+            )[0]
+        hits = client.search(
+            COLLECTION_NAME,
+            [coarse[i]],
+            anns_field=COARSE_FIELD,
+            limit=k * oversample,
+            output_fields=["embedding"],
+            search_params=params,
+        )[0]
+        return rerank(queries[i], list(hits), k)
+
+    for i in range(min(10, len(queries))):
+        search(i)
+
+    found: list[list[int]] = []
+    latencies: list[float] = []
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        hits = search(i)
+        latencies.append(time.perf_counter() - start)
+        found.append([hit["id"] for hit in hits])
+    return recall_at_k(np.array(found), truth), latencies
+
+
+def milvus_report(
+    corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, args
+) -> None:
+    """在 Milvus 中比较全维搜索与各候选倍数两阶段检索的召回率与延迟"""
+    settings = get_settings()
+    if args.real:
+        client = MilvusClient(
+            uri=settings.zilliz_cloud_uri, token=settings.zilliz_cloud_token
+        )
+    else:
+        client = MilvusClient(str(Path(tempfile.mkdtemp()) / "two_stage.db"))
+
+    try:
+        for dimension in args.dimensions:
+            load_data(client, corpus, dimension, args.batch_size)
+            print(
+                f"\n粗排维度 {dimension}，索引 {settings.milvus_index_type}，"
+                f"搜索参数 {settings.milvus_search_params or '默认'}"
+            )
+            print(
+                f"{'检索方式':<14} {'recall@' + str(args.top_k):>10} "
+                f"{'p50':>10} {'p99':>10}"
+            )
+            for oversample in [0, *args.oversample]:
+                recall, latencies = measure(
+                    client, queries, truth, args.top_k, dimension, oversample
+                )
+                name = f"两阶段 x{oversample}" if oversample else "全维"
+                print(
+                    f"{name:<14} {recall:>10.4f} "
+                    f"{percentile(latencies, 50) * 1000:8.2f}ms "
+                    f"{percentile(latencies, 99) * 1000:8.2f}ms"
+                )
+    finally:
+        if client.has_collection(COLLECTION_NAME):
+            client.drop_collection(COLLECTION_NAME)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="两阶段检索召回率与延迟对比")
+    parser.add_argument("--snapshot", help="使用 embedding 快照中的向量")
+    parser.add_argument("--rows", type=int, default=20000, help="随机向量条数")
+    parser.add_argument("--dimension", type=int, default=1024, help="随机向量维度")
+    parser.add_argument(
+        "--decay", type=float, default=64.0, help="随机向量逐维衰减速度，越小越集中"
+    )
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument(
+        "--dimensions", type=int, nargs="+", default=[128, 256, 512], help="粗排维度"
+    )
+    parser.add_argument(
+        "--oversample", type=int, nargs="+", default=[1, 2, 4, 8], help="候选倍数"
+    )
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--milvus", action="store_true", help="在 Milvus 中测延迟")
+    parser.add_argument("--real", action="store_true", help="连接真实 Zilliz 集群")
+    args = parser.parse_args()
+
+    if args.snapshot:
+        corpus, queries = load_snapshot(args.snapshot, args.queries)
+    else:
+        corpus, queries = make_matryoshka_vectors(
+            args.rows, args.queries, args.dimension, args.decay
+        )
+
+    # 基准为全维精确结果
+    truth = exact_top_k(corpus, queries, args.top_k)
+    print(f"{len(corpus)} 条向量，维度 {corpus.shape[1]}，{len(queries)} 条查询\n")
+
+    offline_report(corpus, queries, truth, args)
+    if args.milvus or args.real:
+        milvus_report(corpus, queries, truth, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+向量存储精度对比
+比较 float32 / float16 / bfloat16 三种向量字段的内存占用、召回率与搜索延迟 (MILVUS_VECTOR_DTYPE 配置)
+
+默认离线运行：按维度计算向量数据的内存占用，把库和查询量化为半精度后做精确搜索，
+与 float32 精确结果对比得到精度本身带来的 recall@k 损失，并测量整批转换的耗时；
+--real 时在 .env 中的集群上为每种精度各建一个临时集合 (索引类型与参数取当前配置)，
+测量单查询延迟 p50/p99 与实际索引下的 recall@k，结束后删除
+(Milvus Lite 不支持半精度向量字段，延迟对比只能在真实集群上进行)
+
+用法:
+    python -m benchmarks.bench_vector_dtype --rows 100000 --dimension 1024
+    python -m benchmarks.bench_vector_dtype --snapshot .cache/snapshots/classic_books_v20250101120000
+    python -m benchmarks.bench_vector_dtype --snapshot ... --real
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from pymilvus import MilvusClient, MilvusException
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import get_settings
+from backend.vector_index import (
+    VECTOR_DTYPES,
+    decode_vectors,
+    encode_queries,
+    encode_vectors,
+    search_params,
+)
+from benchmarks.bench_import_write import wait_for_index
+from benchmarks.tune_index import load_snapshot, make_vectors
+from benchmarks.utils import percentile
+from scripts.ground_truth import exact_top_k, normalize
+from scripts.import_data import build_index, create_collection
+
+COLLECTION_PREFIX = "bench_vector_dtype"
+
+
+def recall_at_k(found: np.ndarray, expected: np.ndarray) -> float:
+    """两组 top-k 主键的平均重合比例"""
+    k = expected.shape[1]
+    return float(
+        np.mean([len(set(a) & set(b)) / k for a, b in zip(found.tolist(), expected)])
+    )
+
+
+def quantize(vectors: np.ndarray, vector_dtype: str) -> np.ndarray:
+    """按存储精度编码再解码，得到 Milvus 中实际参与计算的向量"""
+    return decode_vectors(encode_vectors(vectors, vector_dtype), vector_dtype)
+
+
+def offline_report(
+    corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int
+) -> None:
+    """内存占用、精确搜索下的召回率与整批转换耗时"""
+    rows, dimension = corpus.shape
+    print(
+        f"{'精度':<10} {'每条向量':>10} {'向量数据':>12} {'节省':>8} "
+        f"{'recall@' + str(k):>10} {'转换耗时':>10}"
+    )
+    for vector_dtype, (_, width) in VECTOR_DTYPES.items():
+        start = time.perf_counter()
+        encode_vectors(corpus, vector_dtype)
+        convert_time = time.perf_counter() - start
+
+        ids = exact_top_k(
+            normalize(quantize(corpus, vector_dtype)),
+            normalize(quantize(queries, vector_dtype)),
+            k,
+        )
+        size = rows * dimension * width
+        saved = 1 - width / VECTOR_DTYPES["float32"][1]
+        print(
+            f"{vector_dtype:<10} {dimension * width:>8} B "
+            f"{size / 1024**2:>9.1f} MB {saved:>8.0%} "
+            f"{recall_at_k(ids, truth):>10.4f} {convert_time * 1000:>8.1f}ms"
+        )
+
+
+def load_data(
+    client: MilvusClient, name: str, corpus: np.ndarray, vector_dtype: str, args
+) -> float:
+    """创建指定精度的临时集合、写入向量并按当前配置建索引，返回建索引耗时"""
+    settings = get_settings()
+    create_collection(
+        client, name, corpus.shape[1], with_index=False, vector_dtype=vector_dtype
+    )
+    for start in range(0, len(corpus), args.batch_size):
+        vectors = encode_vectors(corpus[start : start + args.batch_size], vector_dtype)
+        client.insert(
+            name,
+            [
+                {
+                    "id": start + i,
+                    "embedding": vector,
+                    "content": "",
+                    "page": "",
+                    "book": "",
+                    "content_hash": "",
+                }
+                for i, vector in enumerate(vectors)
+            ],
+        )
+
+    start = time.perf_counter()
+    build_index(client, name, settings.milvus_index_type, settings.milvus_index_params)
+    wait_for_index(client, name)
+    return time.perf_counter() - start
+
+
+def measure(
+    client: MilvusClient,
+    name: str,
+    queries: np.ndarray,
+    truth: np.ndarray,
+    k: int,
+    vector_dtype: str,
+) -> tuple[float, list[float]]:
+    """逐条查询 (nq=1)，返回 (平均 recall@k, 每条查询的延迟)"""
+    settings = get_settings()
+    params = search_params(settings.milvus_index_type, settings.milvus_search_params)
+    vectors = encode_queries(queries, vector_dtype)
+    for vector in vectors[:10]:
+        client.search(name, [vector], limit=k, search_params=params)
+
+    found: list[list[int]] = []
+    latencies: list[float] = []
+    for vector in vectors:
+        start = time.perf_counter()
+        hits = client.search(name, [vector], limit=k, search_params=params)
+        latencies.append(time.perf_counter() - start)
+        found.append([hit["id"] for hit in hits[0]])
+    return recall_at_k(np.array(found), truth), latencies
+
+
+def real_report(
+    corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, args
+) -> None:
+    """在真实集群上比较三种精度的搜索延迟与召回率"""
+    settings = get_settings()
+    client = MilvusClient(
+        uri=settings.zilliz_cloud_uri, token=settings.zilliz_cloud_token
+    )
+    print(
+        f"\n集群: {settings.zilliz_cloud_uri}，索引 {settings.milvus_index_type} "
+        f"{settings.milvus_index_params or ''}，搜索参数 "
+        f"{settings.milvus_search_params or '默认'}"
+    )
+    print(
+        f"{'精度':<10} {'建索引':>8} {'recall@' + str(args.top_k):>10} "
+        f"{'p50':>10} {'p99':>10}"
+    )
+    try:
+        for vector_dtype in VECTOR_DTYPES:
+            name = f"{COLLECTION_PREFIX}_{vector_dtype}"
+            try:
+                build_time = load_data(client, name, corpus, vector_dtype, args)
+                recall, latencies = measure(
+                    client, name, queries, truth, args.top_k, vector_dtype
+                )
+            except MilvusException as e:
+                # 部署不支持该向量类型 (如 Milvus Lite 不支持半精度)
+                print(f"{vector_dtype:<10} 跳过: {e.message}")
+                continue
+            finally:
+                if client.has_collection(name):
+                    client.drop_collection(name)
+            print(
+                f"{vector_dtype:<10} {build_time:>7.1f}s {recall:>10.4f} "
+                f"{percentile(latencies, 50) * 1000:8.2f}ms "
+                f"{percentile(latencies, 99) * 1000:8.2f}ms"
+            )
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量存储精度对比")
+    parser.add_argument("--snapshot", help="使用 embedding 快照中的向量")
+    parser.add_argument("--rows", type=int, default=100000, help="随机向量条数")
+    parser.add_argument("--dimension", type=int, default=1024, help="随机向量维度")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument(
+        "--real", action="store_true", help="在真实 Zilliz 集群上测延迟"
+    )
+    args = parser.parse_args()
+
+    if args.snapshot:
+        corpus, queries = load_snapshot(args.snapshot, args.queries)
+    else:
+        corpus, queries = make_vectors(args.rows, args.queries, args.dimension)
+
+    # 基准为 float32 精确结果
+    truth = exact_top_k(corpus, queries, args.top_k)
+    print(f"{len(corpus)} 条向量，维度 {corpus.shape[1]}，{len(queries)} 条查询\n")
+
+    offline_report(corpus, queries, truth, args.top_k)
+    if args.real:
+        real_report(corpus, queries, truth, args)
+
+
+if __name__ == "__main__":
+    main()
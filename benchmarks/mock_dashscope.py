@@ -0,0 +1,135 @@
+"""
+本地 DashScope Embedding 模拟服务
+供基准测试使用，不依赖真实 API Key 和网络
+"""
+
+import asyncio
+import hashlib
+import random
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def fake_embedding(text: str, dimension: int) -> list[float]:
+    """根据文本内容生成确定性的伪向量"""
+    seed = int.from_bytes(hashlib.md5(text.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    return [rng.uniform(-1.0, 1.0) for _ in range(dimension)]
+
+
+def create_mock_app(
+    latency: float = 0.02,
+    dimension: int = 1024,
+    quota: float = 0,
+    error_rate: float = 0,
+) -> FastAPI:
+    """
+    创建模拟 embeddings 接口的 FastAPI 应用
+
+    quota > 0 时模拟每秒请求数配额，超出返回 429 (带 Retry-After)；
+    error_rate 为随机返回 503 的概率
+    """
+    app = FastAPI()
+    app.state.calls = 0
+    app.state.items = 0
+    app.state.throttled = 0
+    app.state.errors = 0
+    window: list[float] = []
+
+    @app.post("/compatible-mode/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        texts = body["input"]
+
+        if quota > 0:
+            now = time.monotonic()
+            while window and now - window[0] >= 1.0:
+                window.pop(0)
+            if len(window) >= quota:
+                app.state.throttled += 1
+                retry_after = max(0.0, 1.0 - (now - window[0]))
+                return JSONResponse(
+                    {"error": {"code": "Throttling.RateQuota"}},
+                    status_code=429,
+                    headers={"Retry-After": f"{retry_after:.3f}"},
+                )
+            window.append(now)
+
+        if error_rate and random.random() < error_rate:
+            app.state.errors += 1
+            return JSONResponse({"error": {"code": "ServiceUnavailable"}}, 503)
+
+        app.state.calls += 1
+        app.state.items += len(texts)
+
+        await asyncio.sleep(latency)
+
+        return {
+            "object": "list",
+            "model": body["model"],
+            "data": [
+                {
+                    "object": "embedding",
+                    "index": i,
+                    "embedding": fake_embedding(text, dimension),
+                }
+                for i, text in enumerate(texts)
+            ],
+            "usage": {"prompt_tokens": sum(len(t) for t in texts)},
+        }
+
+    return app
+
+
+class MockServer:
+    """在后台线程中运行模拟服务的上下文管理器"""
+
+    def __init__(
+        self,
+        port: int = 18080,
+        latency: float = 0.02,
+        dimension: int = 1024,
+        quota: float = 0,
+        error_rate: float = 0,
+    ):
+        self.app = create_mock_app(latency, dimension, quota, error_rate)
+        self.base_url = f"http://127.0.0.1:{port}/compatible-mode/v1"
+        config = uvicorn.Config(
+            self.app, host="127.0.0.1", port=port, log_level="warning"
+        )
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def calls(self) -> int:
+        """已收到的 API 调用次数"""
+        return self.app.state.calls
+
+    @property
+    def items(self) -> int:
+        """已处理的文本条数"""
+        return self.app.state.items
+
+    @property
+    def throttled(self) -> int:
+        """因超出配额返回 429 的次数"""
+        return self.app.state.throttled
+
+    @property
+    def errors(self) -> int:
+        """随机返回 503 的次数"""
+        return self.app.state.errors
+
+    def __enter__(self) -> "MockServer":
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self._server.should_exit = True
+        self._thread.join()
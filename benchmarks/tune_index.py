@@ -0,0 +1,234 @@
+"""
+向量索引调优
+在同一份数据上依次构建不同类型的索引，扫描搜索参数，与精确暴力搜索的结果对比，
+输出 recall@k 与单查询延迟 p50/p99，用数据选择索引类型与参数 (MILVUS_INDEX_* 配置)
+
+数据来自 embedding 快照 (--snapshot，查询为从中随机留出的向量) 或随机生成的聚簇向量；
+默认使用 Milvus Lite 本地文件，延迟特性与 Zilliz Cloud 不同，最终选择应以 --real 的结果为准
+(--real 会在 .env 中的集群上创建并删除临时集合)
+
+用法:
+    python -m benchmarks.tune_index --rows 20000 --dimension 256
+    python -m benchmarks.tune_index --snapshot .cache/snapshots/classic_books_v20250101120000
+    python -m benchmarks.tune_index --index HNSW --build '{"M": 32}' --search '[{"ef": 32}, {"ef": 128}]'
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from pymilvus import MilvusClient, MilvusException
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import get_settings
+from backend.vector_index import build_params, check_index_type, search_params
+from benchmarks.bench_import_write import wait_for_index
+from benchmarks.utils import percentile
+from scripts.ground_truth import exact_top_k, normalize
+from scripts.import_data import build_index, create_collection
+from scripts.snapshot import Snapshot
+
+COLLECTION_NAME = "bench_tune_index"
+
+# 各索引类型默认扫描的搜索参数，从快到准排列
+SEARCH_SWEEPS: dict[str, list[dict]] = {
+    "AUTOINDEX": [{}],
+    "FLAT": [{}],
+    "HNSW": [{"ef": ef} for ef in (16, 32, 64, 128, 256)],
+    "IVF_FLAT": [{"nprobe": n} for n in (1, 4, 8, 16, 32, 64)],
+    "IVF_SQ8": [{"nprobe": n} for n in (1, 4, 8, 16, 32, 64)],
+    "IVF_PQ": [{"nprobe": n} for n in (1, 4, 8, 16, 32, 64)],
+    "DISKANN": [{"search_list": n} for n in (20, 50, 100, 200)],
+    "SCANN": [{"nprobe": n, "reorder_k": 100} for n in (4, 16, 64)],
+}
+
+
+def make_vectors(
+    rows: int, queries: int, dimension: int, clusters: int = 100
+) -> tuple[np.ndarray, np.ndarray]:
+    """生成聚簇分布的随机向量 (比均匀分布更接近真实 embedding)，返回 (库, 查询)"""
+    rng = np.random.default_rng(42)
+    centers = rng.normal(size=(clusters, dimension)).astype(np.float32)
+
+    def sample(count: int) -> np.ndarray:
+        noise = rng.normal(scale=0.6, size=(count, dimension)).astype(np.float32)
+        return normalize(centers[rng.integers(0, clusters, count)] + noise)
+
+    return sample(rows), sample(queries)
+
+
+def load_snapshot(path: str, queries: int) -> tuple[np.ndarray, np.ndarray]:
+    """读取快照中的全部向量，随机留出 queries 条作为查询，返回 (库, 查询)"""
+    vectors = np.concatenate(
+        [vectors.astype(np.float32) for _, vectors in Snapshot(path).iter_parts()]
+    )
+    # 留出查询后库中至少还要剩一条向量
+    if not 0 < queries < len(vectors):
+        raise SystemExit(
+            f"错误: --queries 必须在 1 到 {len(vectors) - 1} 之间 "
+            f"(快照共 {len(vectors)} 条向量)"
+        )
+    rng = np.random.default_rng(42)
+    held_out = np.zeros(len(vectors), dtype=bool)
+    held_out[rng.choice(len(vectors), size=queries, replace=False)] = True
+    return normalize(vectors[~held_out]), normalize(vectors[held_out])
+
+
+def load_collection_data(client: MilvusClient, corpus: np.ndarray, batch_size: int):
+    """创建不带索引的临时集合并写入向量 (主键为行号)"""
+    create_collection(client, COLLECTION_NAME, corpus.shape[1], with_index=False)
+    for start in range(0, len(corpus), batch_size):
+        client.insert(
+            COLLECTION_NAME,
+            [
+                {
+                    "id": start + i,
+                    "embedding": vector.tolist(),
+                    "content": "",
+                    "page": "",
+                    "book": "",
+                    "content_hash": "",
+                }
+                for i, vector in enumerate(corpus[start : start + batch_size])
+            ],
+        )
+    client.flush(COLLECTION_NAME)
+
+
+def rebuild_index(client: MilvusClient, index_type: str, params: dict) -> float:
+    """删除现有索引并按新配置重建，返回建索引耗时"""
+    client.release_collection(COLLECTION_NAME)
+    for index_name in client.list_indexes(COLLECTION_NAME):
+        client.drop_index(COLLECTION_NAME, index_name)
+
+    start = time.perf_counter()
+    build_index(client, COLLECTION_NAME, index_type, params)
+    wait_for_index(client, COLLECTION_NAME)
+    return time.perf_counter() - start
+
+
+def measure(
+    client: MilvusClient,
+    queries: np.ndarray,
+    truth: np.ndarray,
+    k: int,
+    params: dict,
+) -> tuple[float, list[float]]:
+    """逐条查询 (nq=1)，返回 (平均 recall@k, 每条查询的延迟)"""
+    vectors = queries.tolist()
+    for vector in vectors[:10]:
+        client.search(COLLECTION_NAME, [vector], limit=k, search_params=params)
+
+    recalls: list[float] = []
+    latencies: list[float] = []
+    for vector, expected in zip(vectors, truth):
+        start = time.perf_counter()
+        hits = client.search(COLLECTION_NAME, [vector], limit=k, search_params=params)
+        latencies.append(time.perf_counter() - start)
+        found = {hit["id"] for hit in hits[0]}
+        recalls.append(len(found.intersection(expected.tolist())) / k)
+    return float(np.mean(recalls)), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量索引 recall / 延迟调优")
+    parser.add_argument("--snapshot", help="使用 embedding 快照中的向量")
+    parser.add_argument("--rows", type=int, default=20000, help="随机向量条数")
+    parser.add_argument("--dimension", type=int, default=256, help="随机向量维度")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument(
+        "--index",
+        nargs="+",
+        default=["FLAT", "HNSW", "IVF_FLAT", "IVF_SQ8"],
+        help="要比较的索引类型",
+    )
+    parser.add_argument("--build", help="构建参数 (JSON)，覆盖各索引类型的默认值")
+    parser.add_argument("--search", help="要扫描的搜索参数列表 (JSON)，覆盖默认扫描")
+    parser.add_argument(
+        "--target-recall", type=float, default=0.95, help="标记满足该召回率的最快配置"
+    )
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--real", action="store_true", help="连接真实 Zilliz 集群")
+    args = parser.parse_args()
+
+    if args.snapshot:
+        corpus, queries = load_snapshot(args.snapshot, args.queries)
+    else:
+        corpus, queries = make_vectors(args.rows, args.queries, args.dimension)
+
+    start = time.perf_counter()
+    truth = exact_top_k(corpus, queries, args.top_k)
+    print(
+        f"{len(corpus)} 条向量，维度 {corpus.shape[1]}，{len(queries)} 条查询，"
+        f"精确 top-{args.top_k} 计算耗时 {time.perf_counter() - start:.1f}s"
+    )
+
+    if args.real:
+        settings = get_settings()
+        client = MilvusClient(
+            uri=settings.zilliz_cloud_uri, token=settings.zilliz_cloud_token
+        )
+    else:
+        client = MilvusClient(str(Path(tempfile.mkdtemp()) / "tune.db"))
+
+    build_override = json.loads(args.build) if args.build else None
+    search_override = json.loads(args.search) if args.search else None
+
+    try:
+        load_collection_data(client, corpus, args.batch_size)
+
+        for index_type in map(check_index_type, args.index):
+            build = build_params(index_type, build_override)
+            try:
+                build_time = rebuild_index(client, index_type, build)
+            except MilvusException as e:
+                # 不同部署支持的索引类型不同 (如 Milvus Lite 不支持 IVF_PQ)
+                print(f"{index_type} 索引构建失败，跳过: {e.message}")
+                continue
+            print(f"\n{index_type} {json.dumps(build)} 构建耗时 {build_time:.1f}s")
+            print(
+                f"{'搜索参数':<30} {'recall@' + str(args.top_k):>10} "
+                f"{'p50':>10} {'p99':>10}"
+            )
+
+            results = []
+            for params in search_override or SEARCH_SWEEPS[index_type]:
+                full_params = search_params(index_type, params)
+                recall, latencies = measure(
+                    client, queries, truth, args.top_k, full_params
+                )
+                results.append(
+                    (
+                        full_params["params"],
+                        recall,
+                        percentile(latencies, 50),
+                        percentile(latencies, 99),
+                    )
+                )
+
+            # 标记满足目标召回率且 p99 最低的配置
+            eligible = [r for r in results if r[1] >= args.target_recall]
+            best = min(eligible, key=lambda r: r[3]) if eligible else None
+            for params, recall, p50, p99 in results:
+                marker = " *" if best and params == best[0] else ""
+                print(
+                    f"{json.dumps(params):<34} {recall:10.3f} "
+                    f"{p50 * 1000:8.2f}ms {p99 * 1000:8.2f}ms{marker}"
+                )
+
+        print(f"\n* 满足 recall@{args.top_k} >= {args.target_recall} 且 p99 最低的配置")
+    finally:
+        if client.has_collection(COLLECTION_NAME):
+            client.drop_collection(COLLECTION_NAME)
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+"""基准测试公共工具"""
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """计算百分位数 (最近秩法)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def format_latency(name: str, samples: list[float]) -> str:
+    """格式化延迟统计 (毫秒)"""
+    return (
+        f"{name:<24} n={len(samples):<6} "
+        f"p50={percentile(samples, 50) * 1000:8.2f}ms "
+        f"p99={percentile(samples, 99) * 1000:8.2f}ms"
+    )
@@ -15,11 +15,99 @@ class Settings(BaseSettings):
     zilliz_cloud_token: str = ""
 
     # Milvus 集合配置
-    milvus_collection_name: str = "classic_books"
+    milvus_collection_name: str = "classic_books"  # 后端查询的集合别名
+    milvus_gc_grace_period: float = 3600.0  # 旧版本集合被替换后保留的时间 (秒)
+    milvus_max_concurrency: int = 16  # Milvus 调用线程池大小 (最大并发请求数)
+    milvus_batch_max_size: int = 16  # 单次搜索最多合并的查询向量数 (nq)
+    milvus_batch_window: float = 0.002  # 搜索合并等待窗口 (秒)，0 表示不等待
+    milvus_book_partitions: int = 64  # 书名作为分区键时的分区数，0 不使用分区键
+    milvus_refresh_interval: float = 5.0  # 重新读取别名指向与集合版本的间隔 (秒)
+
+    # 向量索引配置 (各索引类型的默认参数见 backend/vector_index.py)
+    milvus_index_type: str = "AUTOINDEX"  # HNSW / IVF_FLAT / IVF_SQ8 / DISKANN 等
+    milvus_index_params: dict = {}  # 构建参数 (JSON)，如 {"M": 32}
+    milvus_search_params: dict = {}  # 搜索参数 (JSON)，如 {"ef": 64}
+    milvus_vector_dtype: str = "float32"  # 新建集合的精度: float32/float16/bfloat16
 
     # Embedding 配置
     embedding_model: str = "text-embedding-v4"  # Qwen 的 embedding 模型
     embedding_dimension: int = 1024  # text-embedding-v4 的维度
+    embedding_coarse_dimension: int = 0  # 粗排向量维度 (如 256)，0 不创建粗排字段
+
+    # Embedding API 连接池配置
+    dashscope_base_url: str = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+    embedding_timeout: float = 30.0  # 单次请求超时 (秒)
+    embedding_http2: bool = True  # 启用 HTTP/2 多路复用
+    embedding_max_connections: int = 100  # 连接池最大连接数
+    embedding_max_keepalive_connections: int = 20  # 最大空闲保活连接数
+    embedding_keepalive_expiry: float = 60.0  # 空闲连接保活时间 (秒)
+
+    # Embedding API 限流与容错配置
+    # 令牌桶按进程计数：后端的限额由所有 worker 平分，导入脚本单独计算，
+    # 两者之和不应超过账号配额
+    embedding_rate_limit: float = 10.0  # 后端每秒最多请求数 (各 worker 合计)
+    embedding_import_rate_limit: float = 10.0  # 导入脚本每秒最多请求数，0 不限流
+    embedding_rate_burst: int = 20  # 令牌桶容量，允许的瞬时突发请求数
+    embedding_max_retries: int = 5  # 导入时限流或服务端错误的最大重试次数
+    embedding_search_max_retries: int = 1  # 后端查询的最大重试次数
+    embedding_search_deadline: float = 5.0  # 后端查询的总时限 (秒)，含重试等待
+    embedding_retry_base_delay: float = 0.5  # 指数退避的初始等待时间 (秒)
+    embedding_retry_max_delay: float = 30.0  # 单次重试的最长等待时间 (秒)
+    embedding_breaker_threshold: int = 5  # 连续失败多少次后熔断，0 表示禁用
+    embedding_breaker_reset: float = 30.0  # 熔断后多久尝试恢复 (秒)
+
+    # 查询 Embedding 缓存配置
+    embedding_cache_size: int = 10000  # 最大缓存条数，0 表示禁用
+    embedding_cache_ttl: float = 86400.0  # 缓存过期时间 (秒)
+    embedding_store_path: str = ".cache/embeddings.sqlite3"  # 持久化缓存，留空禁用
+    embedding_store_max_rows: int = 500000  # 持久化缓存最大条数，0 表示不限制
+    embedding_store_ttl: float = 0.0  # 多久未使用后淘汰 (秒)，0 表示不过期
+
+    # 搜索结果缓存配置
+    search_cache_size: int = 10000  # 最大缓存条数，0 表示禁用
+    search_cache_ttl: float = 3600.0  # 缓存过期时间 (秒)
+
+    # 批量搜索配置
+    search_batch_max_queries: int = 1000  # /search/batch 单次最多查询数
+
+    # 两阶段检索配置 (需要 EMBEDDING_COARSE_DIMENSION，可按请求覆盖)
+    search_two_stage: bool = False  # 默认先用低维向量粗排，再用全维向量重排
+    search_oversample: int = 4  # 粗排候选数 = top_k × oversample
+
+    # 查询 Embedding 微批处理配置
+    embedding_batch_max_size: int = 10  # 单次 API 调用最多合并的查询数
+    embedding_batch_window: float = 0.005  # 合并等待窗口 (秒)，0 表示不等待
+
+    # 数据导入流水线配置
+    import_embed_batch_size: int = 10  # 单次 Embedding API 调用的最大页面数
+    import_embed_batch_tokens: int = (
+        16384  # 单次 Embedding API 调用的最大 token 数 (估算)
+    )
+    import_embed_item_tokens: int = 8192  # 单条输入的最大 token 数，超出的页面会被拆分
+    import_embed_concurrency: int = 4  # 并发 Embedding 请求数
+    import_queue_size: int = 16  # 流水线各阶段之间的队列深度 (批次数)
+    import_book_workers: int = 4  # 多本书导入时并行预处理书籍的进程数
+    import_insert_batch_size: int = 2000  # 单次 Milvus 插入的行数
+    import_defer_index: bool = False  # 全量导入时先写数据，写完后再构建向量索引
+    import_checkpoint_dir: str = ".cache/import_checkpoints"  # 导入断点目录
+    import_snapshot_dir: str = ".cache/snapshots"  # Embedding 快照目录，留空禁用
+
+    # 批量导入 (bulk import) 配置，使用 --bulk 时生效
+    bulk_s3_endpoint: str = ""  # S3 兼容对象存储地址 (如 oss-cn-hangzhou.aliyuncs.com)
+    bulk_s3_access_key: str = ""
+    bulk_s3_secret_key: str = ""
+    bulk_s3_bucket: str = ""
+    bulk_s3_secure: bool = True  # 使用 HTTPS 访问对象存储
+    bulk_remote_path: str = "classic_index/bulk"  # 分片在桶内的目录
+    bulk_local_path: str = ".cache/bulk_writer"  # 分片上传前的本地临时目录
+    bulk_chunk_size_mb: int = 512  # 单个 Parquet 分片大小 (MB)
+    bulk_import_url: str = ""  # 导入接口地址，留空使用 ZILLIZ_CLOUD_URI (自建 Milvus)
+    bulk_import_api_key: str = ""  # 导入接口密钥，留空使用 ZILLIZ_CLOUD_TOKEN
+    bulk_cluster_id: str = ""  # Zilliz Cloud 集群 ID，设置后按云端方式提交对象存储地址
+    bulk_object_url_prefix: str = (
+        ""  # 云端导入的对象地址前缀，默认 s3://{BULK_S3_BUCKET}
+    )
+    bulk_poll_interval: float = 5.0  # 查询导入任务进度的间隔 (秒)
 
     # 书籍配置
     book_name: str = "马克思全集1"
@@ -28,6 +116,17 @@ class Settings(BaseSettings):
     api_host: str = "0.0.0.0"
     api_port: int = 8000
 
+    # 服务启动配置
+    server_mode: str = (
+        "development"  # development: 单进程自动重载; production: 多 worker
+    )
+    api_workers: int = 4  # production 模式下的 worker 进程数
+    api_loop: str = "uvloop"  # 事件循环实现
+    api_http: str = "httptools"  # HTTP 协议解析实现
+    api_backlog: int = 2048  # 监听队列长度
+    api_keepalive_timeout: int = 15  # HTTP keep-alive 超时 (秒)
+    api_graceful_timeout: int = 30  # 收到 SIGTERM 后等待进行中请求完成的时间 (秒)
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
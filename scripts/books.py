@@ -0,0 +1,175 @@
+"""
+多书籍并行预处理
+在进程池中解析书籍文件、按逻辑页合并并拆分超长页面，
+主进程按完成顺序把各书的页面交给同一条导入流水线
+"""
+
+import glob
+import json
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from tqdm import tqdm
+
+from scripts.ingest import iter_book_records, iter_pages
+from scripts.token_batcher import TokenBatcher
+
+# 支持的书籍文件格式
+BOOK_SUFFIXES = (".json", ".jsonl")
+
+
+def resolve_sources(source: str) -> list[Path]:
+    """将文件、目录或 glob 模式解析为书籍文件列表 (书名取文件名)"""
+    path = Path(source)
+    if path.is_dir():
+        files = [p for p in path.iterdir() if p.suffix in BOOK_SUFFIXES]
+    elif glob.has_magic(source):
+        files = [Path(p) for p in glob.glob(source, recursive=True)]
+        files = [p for p in files if p.is_file() and p.suffix in BOOK_SUFFIXES]
+    else:
+        files = [path] if path.is_file() else []
+    return sorted(files)
+
+
+def preprocess_book(
+    path: str, max_item_tokens: int, output_dir: str
+) -> tuple[str, str, int]:
+    """
+    在子进程中预处理一本书，页面逐行写入 output_dir 下的临时 JSONL 文件
+
+    返回 (书名, 页面文件路径, 拆分的超长页面数)；页面不经进程间通信整本返回，
+    子进程与主进程的内存占用都与书的大小无关
+    """
+    book = Path(path).stem
+    splitter = TokenBatcher(1, max_item_tokens, max_item_tokens)
+    output = tempfile.NamedTemporaryFile(
+        "w",
+        encoding="utf-8",
+        dir=output_dir,
+        prefix=f"{book}_",
+        suffix=".jsonl",
+        delete=False,
+    )
+    with output:
+        for page in splitter.split_oversized(iter_pages(iter_book_records(path), book)):
+            output.write(json.dumps(page, ensure_ascii=False) + "\n")
+    return book, output.name, splitter.split_pages
+
+
+def read_pages(path: Path) -> Iterator[dict]:
+    """逐行读取预处理好的页面文件，读完后删除"""
+    try:
+        with path.open(encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+    finally:
+        path.unlink(missing_ok=True)
+
+
+def iter_books_parallel(
+    paths: list[Path],
+    executor: Executor,
+    batcher: TokenBatcher,
+    max_in_flight: int,
+) -> Iterator[dict]:
+    """
+    并行预处理多本书，按完成顺序逐本产出页面
+
+    子进程按 batcher 的单条上限拆分超长页面，拆分数计入 batcher 的统计；
+    同时最多有 max_in_flight 本书在预处理或等待导入，预处理结果暂存在临时文件中，
+    主进程逐行读取，内存占用与书的大小无关；同一本书的页面连续产出
+    """
+    pending = iter(paths)
+    running: set[Future] = set()
+    with tempfile.TemporaryDirectory(
+        prefix="books_", ignore_cleanup_errors=True
+    ) as output_dir:
+
+        def submit_next() -> bool:
+            path = next(pending, None)
+            if path is None:
+                return False
+            running.add(
+                executor.submit(
+                    preprocess_book, str(path), batcher.max_item_tokens, output_dir
+                )
+            )
+            return True
+
+        while len(running) < max_in_flight and submit_next():
+            pass
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                running.discard(future)
+                book, pages_path, split_pages = future.result()
+                if split_pages:
+                    batcher.split_pages += split_pages
+                    tqdm.write(f"《{book}》拆分超长页面 {split_pages} 个")
+                submit_next()
+                yield from read_pages(Path(pages_path))
+
+
+class BookProgress:
+    """
+    按书统计导入进度
+
+    track 包装送入流水线的页面流，记录每本书需要写入的条数；
+    record 在每批写入成功后调用，某本书全部写入时输出一行完成信息
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.expected: dict[str, int] = {}
+        self.written: dict[str, int] = {}
+        self.started_at: dict[str, float] = {}
+        self.finished_at: dict[str, float] = {}
+        self._fed: set[str] = set()
+
+    def track(self, pages: Iterable[dict]) -> Iterator[dict]:
+        """统计每本书送入流水线的页面数 (同一本书的页面需连续出现)"""
+        current = None
+        for item in pages:
+            book = item["book"]
+            if book != current:
+                self._mark_fed(current)
+                current = book
+                self.started_at.setdefault(book, time.perf_counter())
+            self.expected[book] = self.expected.get(book, 0) + 1
+            yield item
+        self._mark_fed(current)
+
+    def _mark_fed(self, book: str | None):
+        if book is not None:
+            self._fed.add(book)
+            self._check_finished(book)
+
+    def record(self, rows: list[dict]):
+        """记录一批已写入的行"""
+        for row in rows:
+            self.written[row["book"]] = self.written.get(row["book"], 0) + 1
+        for book in {row["book"] for row in rows}:
+            self._check_finished(book)
+
+    def _check_finished(self, book: str):
+        if (
+            book in self._fed
+            and book not in self.finished_at
+            and self.written.get(book, 0) >= self.expected.get(book, 0)
+        ):
+            self.finished_at[book] = time.perf_counter()
+            elapsed = self.finished_at[book] - self.started_at[book]
+            tqdm.write(f"《{book}》完成: {self.expected[book]} 条，用时 {elapsed:.1f}s")
+
+    def report(self):
+        """输出整体吞吐量"""
+        elapsed = time.perf_counter() - self.start
+        rows = sum(self.written.values())
+        print(
+            f"共导入 {len(self.finished_at)}/{len(self.expected)} 本书，{rows} 条，"
+            f"总耗时 {elapsed:.1f}s，吞吐 {rows / max(elapsed, 1e-9):.1f} 条/秒"
+        )
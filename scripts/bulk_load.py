@@ -0,0 +1,155 @@
+"""
+Milvus 批量导入 (bulk import)
+把 embedding 和标量字段写成 Parquet 分片上传到对象存储，再提交一次批量导入任务，
+数据由 Milvus 直接从文件加载，不再经过逐批 insert 的 RPC
+
+需要安装可选依赖: pip install "pymilvus[bulk_writer]"
+"""
+
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+from pymilvus import CollectionSchema
+
+from config import Settings
+
+
+class BulkLoader:
+    """
+    批量导入写入器
+
+    write 把行追加到本地缓冲区，满 bulk_chunk_size_mb 后自动生成 Parquet 分片并上传；
+    finish 提交剩余数据、创建导入任务并等待完成；
+    可作为上下文管理器使用，退出时 (或调用 close) 清理本地临时文件
+    """
+
+    def __init__(
+        self, settings: Settings, schema: CollectionSchema, collection_name: str
+    ):
+        try:
+            from pymilvus.bulk_writer import BulkFileType, RemoteBulkWriter
+        except ImportError as e:
+            raise RuntimeError(
+                '批量导入需要安装 pymilvus[bulk_writer]: pip install "pymilvus[bulk_writer]"'
+            ) from e
+
+        if not (settings.bulk_s3_endpoint and settings.bulk_s3_bucket):
+            raise RuntimeError("批量导入需要设置 BULK_S3_ENDPOINT 和 BULK_S3_BUCKET")
+        if settings.bulk_cluster_id and not settings.bulk_import_url:
+            raise RuntimeError(
+                "Zilliz Cloud 批量导入需要设置 BULK_IMPORT_URL (如 https://api.cloud.zilliz.com.cn)"
+            )
+
+        self.settings = settings
+        self.collection_name = collection_name
+        self.rows = 0
+
+        # 分片先写到本地临时目录，上传后删除
+        local_path = Path(settings.bulk_local_path)
+        local_path.mkdir(parents=True, exist_ok=True)
+        self._stack = ExitStack()
+        writer = RemoteBulkWriter(
+            schema=schema,
+            remote_path=settings.bulk_remote_path,
+            connect_param=RemoteBulkWriter.S3ConnectParam(
+                endpoint=settings.bulk_s3_endpoint,
+                access_key=settings.bulk_s3_access_key,
+                secret_key=settings.bulk_s3_secret_key,
+                bucket_name=settings.bulk_s3_bucket,
+                secure=settings.bulk_s3_secure,
+            ),
+            chunk_size=settings.bulk_chunk_size_mb * 1024 * 1024,
+            file_type=BulkFileType.PARQUET,
+            local_path=str(local_path),
+        )
+        self._writer = self._stack.enter_context(writer)
+
+    def __enter__(self) -> "BulkLoader":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """等待未完成的分片写入并删除本地临时目录"""
+        self._stack.close()
+
+    def write(self, rows: list[dict]):
+        """追加一批行 (在插入阶段的工作线程中调用)"""
+        for row in rows:
+            self._writer.append_row(row)
+        self.rows += len(rows)
+
+    def _import_options(self) -> dict:
+        """Zilliz Cloud 通过对象存储地址导入，自建 Milvus 直接使用桶内的相对路径"""
+        settings = self.settings
+        if settings.bulk_cluster_id:
+            prefix = (
+                settings.bulk_object_url_prefix or f"s3://{settings.bulk_s3_bucket}"
+            )
+            return {
+                "url": settings.bulk_import_url,
+                "api_key": settings.bulk_import_api_key or settings.zilliz_cloud_token,
+                "cluster_id": settings.bulk_cluster_id,
+                "object_urls": [
+                    [f"{prefix.rstrip('/')}/{path.lstrip('/')}" for path in files]
+                    for files in self._writer.batch_files
+                ],
+                "access_key": settings.bulk_s3_access_key,
+                "secret_key": settings.bulk_s3_secret_key,
+            }
+        return {
+            "url": settings.bulk_import_url or settings.zilliz_cloud_uri,
+            "api_key": settings.bulk_import_api_key or settings.zilliz_cloud_token,
+            "files": self._writer.batch_files,
+        }
+
+    @staticmethod
+    def _response_data(response, action: str) -> dict:
+        """检查导入接口的返回码，出错时抛出带接口错误信息的 RuntimeError"""
+        body = response.json()
+        if body.get("code") != 0:
+            raise RuntimeError(
+                f"{action}失败 (code={body.get('code')}): {body.get('message')}"
+            )
+        return body["data"]
+
+    def finish(self) -> int:
+        """提交剩余数据并执行批量导入，返回导入的行数"""
+        from pymilvus.bulk_writer import bulk_import, get_import_progress
+
+        self._writer.commit()
+        if not self.rows:
+            return 0
+
+        options = self._import_options()
+        start = time.perf_counter()
+        response = bulk_import(collection_name=self.collection_name, **options)
+        job_id = self._response_data(response, "提交批量导入任务")["jobId"]
+        print(f"已提交批量导入任务 {job_id}: {len(self._writer.batch_files)} 个分片")
+
+        progress_options = {
+            key: options[key]
+            for key in ("url", "api_key", "cluster_id")
+            if key in options
+        }
+        while True:
+            time.sleep(self.settings.bulk_poll_interval)
+            job = self._response_data(
+                get_import_progress(job_id=job_id, **progress_options),
+                f"查询批量导入任务 {job_id} 进度",
+            )
+            state = job.get("state")
+            if state == "Completed":
+                break
+            if state == "Failed":
+                raise RuntimeError(f"批量导入任务 {job_id} 失败: {job.get('reason')}")
+            print(f"批量导入进度: {job.get('progress', 0)}%")
+
+        elapsed = time.perf_counter() - start
+        print(
+            f"批量导入完成: {self.rows} 条，耗时 {elapsed:.1f}s "
+            f"({self.rows / max(elapsed, 1e-9):.0f} 条/秒)"
+        )
+        return self.rows
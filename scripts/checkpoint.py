@@ -0,0 +1,68 @@
+"""
+导入断点记录
+每次成功写入 Milvus 后追加记录已完成的主键，导入中断后重新运行可跳过已完成的部分
+"""
+
+import json
+import os
+from pathlib import Path
+
+
+class ImportCheckpoint:
+    """
+    以 JSONL 追加写入的导入断点文件
+
+    首行记录本次导入写入的目标集合，之后每行记录一批已写入的主键
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+
+    def exists(self) -> bool:
+        """是否存在未完成导入的断点"""
+        return self.path.exists()
+
+    def start(self, collection_name: str):
+        """开始新的导入，记录目标集合"""
+        self.reset()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"collection": collection_name}) + "\n")
+
+    def collection(self) -> str | None:
+        """读取未完成导入的目标集合"""
+        if not self.path.exists():
+            return None
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            try:
+                return json.loads(f.readline()).get("collection")
+            except ValueError:
+                return None
+
+    def load(self) -> set[int]:
+        """读取所有已完成的主键"""
+        done: set[int] = set()
+        if not self.path.exists():
+            return done
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    done.update(json.loads(line)["ids"])
+                except (ValueError, KeyError):
+                    # 中断时可能留下不完整的最后一行，忽略即可
+                    continue
+        return done
+
+    def record(self, ids: list[int]):
+        """追加一批已完成的主键并落盘"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"ids": ids}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def reset(self):
+        """删除断点文件"""
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,409 @@
+"""
+召回率基准 (ground truth)
+从 embedding 快照或线上集合分块读取全部向量，用分块矩阵乘法计算查询集的精确 top-k 并保存；
+之后可以用它评估任意线上搜索配置的 recall@k 与延迟
+
+向量库按块流式处理，每块只与当前的 top-k 合并，内存占用与库大小无关，可处理大于内存的库
+
+用法:
+    # 从快照中随机抽取 200 条向量作为查询 (排除自身)
+    python scripts/ground_truth.py build --snapshot .cache/snapshots/classic_books_v20250101120000 --sample 200
+    # 导出线上集合，使用真实查询文本 (每行一条，调用 Embedding API)
+    python scripts/ground_truth.py build --queries-file queries.txt
+    # 评估当前配置的搜索参数，或指定其他参数
+    python scripts/ground_truth.py evaluate --truth .cache/ground_truth/classic_books.npz
+    python scripts/ground_truth.py evaluate --truth ... --search-params '{"ef": 32}'
+    # 评估两阶段检索 (低维粗排 + 全维重排)
+    python scripts/ground_truth.py evaluate --truth ... --two-stage --oversample 4
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from functools import partial
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+from pymilvus import MilvusClient
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import Settings, get_settings
+from backend.embedding import EmbeddingClient
+from backend.rerank import COARSE_FIELD, rerank, truncate
+from backend.vector_index import decode_vectors, encode_queries, search_params
+from scripts.import_data import collection_coarse_dimension, collection_vector_dtype
+from scripts.snapshot import Snapshot
+
+# 导出集合时每次读取的行数
+EXPORT_BATCH_SIZE = 4096
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """按行归一化为 float32，余弦相似度即为内积"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class TopK:
+    """
+    分块精确 top-k
+
+    每加入一块向量，先计算查询与该块的相似度矩阵并取出块内的 top-k，
+    再与当前的 top-k 合并 (相当于逐块合并每个查询的小顶堆)，
+    内存占用只取决于查询数、k 和块大小
+    """
+
+    def __init__(
+        self, queries: np.ndarray, k: int, exclude_ids: np.ndarray | None = None
+    ):
+        self.queries = normalize(queries)
+        self.k = k
+        # 查询本身来自向量库时，排除自身的主键
+        self.exclude_ids = exclude_ids
+        self.scores = np.empty((len(queries), 0), dtype=np.float32)
+        self.ids = np.empty((len(queries), 0), dtype=np.int64)
+        self.rows = 0
+
+    def _select(
+        self, scores: np.ndarray, ids: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """每行只保留相似度最高的 k 个 (不排序)"""
+        if scores.shape[1] <= self.k:
+            return scores, ids
+        top = np.argpartition(scores, -self.k, axis=1)[:, -self.k :]
+        return np.take_along_axis(scores, top, axis=1), np.take_along_axis(
+            ids, top, axis=1
+        )
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray):
+        """加入一块向量及其主键"""
+        ids = np.asarray(ids, dtype=np.int64)
+        block_scores = self.queries @ normalize(vectors).T
+        if self.exclude_ids is not None:
+            block_scores[self.exclude_ids[:, None] == ids[None, :]] = -np.inf
+
+        # 块内 top-k 的主键通过列号映射，避免为整块构造主键矩阵
+        if block_scores.shape[1] > self.k:
+            top = np.argpartition(block_scores, -self.k, axis=1)[:, -self.k :]
+            block_scores = np.take_along_axis(block_scores, top, axis=1)
+            block_ids = ids[top]
+        else:
+            block_ids = np.broadcast_to(ids, block_scores.shape)
+
+        self.scores, self.ids = self._select(
+            np.concatenate([self.scores, block_scores], axis=1),
+            np.concatenate([self.ids, block_ids], axis=1),
+        )
+        self.rows += len(ids)
+
+    def result(self) -> tuple[np.ndarray, np.ndarray]:
+        """返回按相似度降序排列的 (主键, 相似度)"""
+        order = np.argsort(-self.scores, axis=1, kind="stable")
+        return (
+            np.take_along_axis(self.ids, order, axis=1),
+            np.take_along_axis(self.scores, order, axis=1),
+        )
+
+
+def exact_top_k(
+    corpus: np.ndarray, queries: np.ndarray, k: int, block_size: int = 16384
+) -> np.ndarray:
+    """内存中的向量库的精确 top-k 行号 (按相似度降序)"""
+    top_k = TopK(queries, k)
+    for start in range(0, len(corpus), block_size):
+        block = corpus[start : start + block_size]
+        top_k.add(np.arange(start, start + len(block)), block)
+    return top_k.result()[0]
+
+
+def rebatch(
+    blocks: Iterator[tuple[np.ndarray, np.ndarray]], block_size: int
+) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """把大小不一的 (主键, 向量) 块重新切分为 block_size 行一块"""
+    ids_buffer: list[np.ndarray] = []
+    vectors_buffer: list[np.ndarray] = []
+    buffered = 0
+    for ids, vectors in blocks:
+        for start in range(0, len(ids), block_size):
+            ids_buffer.append(ids[start : start + block_size])
+            vectors_buffer.append(vectors[start : start + block_size])
+            buffered += len(ids_buffer[-1])
+            if buffered >= block_size:
+                yield np.concatenate(ids_buffer), np.concatenate(vectors_buffer)
+                ids_buffer, vectors_buffer, buffered = [], [], 0
+    if buffered:
+        yield np.concatenate(ids_buffer), np.concatenate(vectors_buffer)
+
+
+def iter_snapshot_blocks(path: str) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """按分片读取快照 (向量为内存映射，主键重复的行只保留第一次出现)"""
+    seen: set[int] = set()
+    for metadata, vectors in Snapshot(path).iter_parts():
+        ids = np.array([row["id"] for row in metadata], dtype=np.int64)
+        keep = np.array([row_id not in seen for row_id in ids.tolist()], dtype=bool)
+        seen.update(ids.tolist())
+        yield ids[keep], vectors[keep]
+
+
+def iter_collection_blocks(
+    client: MilvusClient, collection_name: str
+) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """分批导出集合中的全部主键与向量 (半精度集合的向量转回 float32)"""
+    vector_dtype = collection_vector_dtype(client, collection_name)
+    iterator = client.query_iterator(
+        collection_name,
+        batch_size=EXPORT_BATCH_SIZE,
+        filter="",
+        output_fields=["id", "embedding"],
+    )
+    try:
+        while batch := iterator.next():
+            yield (
+                np.array([row["id"] for row in batch], dtype=np.int64),
+                decode_vectors([row["embedding"] for row in batch], vector_dtype),
+            )
+    finally:
+        iterator.close()
+
+
+def sample_queries(
+    blocks: Iterator[tuple[np.ndarray, np.ndarray]], count: int, seed: int = 42
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    均匀抽样 count 条向量作为查询，返回 (主键, 向量)
+
+    为每行分配一个随机数，逐块保留随机数最小的 count 行，只需读取一遍
+    """
+    rng = np.random.default_rng(seed)
+    keys = np.empty(0)
+    ids = np.empty(0, dtype=np.int64)
+    vectors: np.ndarray | None = None
+    for block_ids, block_vectors in blocks:
+        block_vectors = np.asarray(block_vectors, dtype=np.float32)
+        keys = np.concatenate([keys, rng.random(len(block_ids))])
+        ids = np.concatenate([ids, block_ids])
+        vectors = (
+            block_vectors
+            if vectors is None
+            else np.concatenate([vectors, block_vectors])
+        )
+        if len(keys) > count:
+            keep = np.argpartition(keys, count - 1)[:count]
+            keys, ids, vectors = keys[keep], ids[keep], vectors[keep]
+
+    if vectors is None or not len(ids):
+        raise RuntimeError("向量库为空")
+    return ids, vectors
+
+
+async def embed_queries(settings: Settings, texts: list[str]) -> np.ndarray:
+    """调用 Embedding API 计算查询文本的向量"""
+    client = EmbeddingClient(settings, timeout=60.0)
+    try:
+        batch_size = settings.embedding_batch_max_size
+        embeddings = []
+        for start in range(0, len(texts), batch_size):
+            embeddings.extend(
+                await client.embed_batch(texts[start : start + batch_size])
+            )
+        return np.array(embeddings, dtype=np.float32)
+    finally:
+        await client.aclose()
+
+
+def save_ground_truth(path: Path, **arrays):
+    """保存为 .npz (查询、精确结果与元数据)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(path, **arrays)
+
+
+def build(args, settings: Settings):
+    """计算并保存精确 top-k"""
+    client = None
+    if args.snapshot:
+        source = args.snapshot
+        blocks = partial(iter_snapshot_blocks, args.snapshot)
+    else:
+        client = MilvusClient(
+            uri=settings.zilliz_cloud_uri, token=settings.zilliz_cloud_token
+        )
+        source = args.collection or settings.milvus_collection_name
+        client.load_collection(source)
+        blocks = partial(iter_collection_blocks, client, source)
+
+    if args.queries_file:
+        texts = [
+            line.strip()
+            for line in Path(args.queries_file).read_text(encoding="utf-8").splitlines()
+            if line.strip()
+        ]
+        queries = asyncio.run(embed_queries(settings, texts))
+        exclude_ids = np.full(len(texts), -1, dtype=np.int64)
+    else:
+        # 抽样需要先完整读取一遍向量库
+        exclude_ids, queries = sample_queries(blocks(), args.sample)
+        texts = []
+
+    start = time.perf_counter()
+    top_k = TopK(queries, args.top_k, exclude_ids)
+    for ids, vectors in rebatch(blocks(), args.block_size):
+        top_k.add(ids, vectors)
+        print(f"\r已处理 {top_k.rows} 条向量", end="", flush=True)
+    elapsed = time.perf_counter() - start
+    print(
+        f"\n精确 top-{args.top_k}: {len(queries)} 条查询 × {top_k.rows} 条向量，"
+        f"耗时 {elapsed:.1f}s ({top_k.rows * len(queries) / max(elapsed, 1e-9):.3g} 次相似度计算/秒)"
+    )
+
+    ids, scores = top_k.result()
+    output = Path(args.output or f".cache/ground_truth/{Path(source).name}.npz")
+    save_ground_truth(
+        output,
+        queries=normalize(queries),
+        query_texts=np.array(texts, dtype=str),
+        exclude_ids=exclude_ids,
+        ids=ids,
+        scores=scores,
+        meta=np.array(
+            json.dumps(
+                {
+                    "source": source,
+                    "rows": top_k.rows,
+                    "top_k": args.top_k,
+                    "model": settings.embedding_model,
+                    "created_at": time.time(),
+                },
+                ensure_ascii=False,
+            )
+        ),
+    )
+    print(f"已保存: {output}")
+    if client:
+        client.close()
+
+
+def evaluate(args, settings: Settings):
+    """用保存的精确结果评估线上集合的 recall@k 与单查询延迟"""
+    truth = np.load(args.truth)
+    meta = json.loads(str(truth["meta"]))
+    if args.top_k > meta["top_k"]:
+        raise SystemExit(f"错误: 基准只保存了 top-{meta['top_k']}")
+
+    client = MilvusClient(
+        uri=settings.zilliz_cloud_uri, token=settings.zilliz_cloud_token
+    )
+    collection_name = args.collection or settings.milvus_collection_name
+    client.load_collection(collection_name)
+    override = json.loads(args.search_params) if args.search_params else None
+    params = search_params(
+        args.index_type or settings.milvus_index_type,
+        override if override is not None else settings.milvus_search_params,
+    )
+
+    vector_dtype = collection_vector_dtype(client, collection_name)
+    oversample = args.oversample or settings.search_oversample
+    full_queries = truth["queries"]
+    if args.two_stage:
+        coarse_dimension = collection_coarse_dimension(client, collection_name)
+        if not coarse_dimension:
+            raise SystemExit(f"错误: 集合 {collection_name} 没有粗排向量字段")
+        full_queries = full_queries.astype(np.float32)
+        # 粗排在低维字段上搜索，候选的全维向量一并取回用于重排
+        queries = encode_queries(truncate(full_queries, coarse_dimension), vector_dtype)
+        anns_field, output_fields = COARSE_FIELD, ["embedding"]
+    else:
+        # 查询向量按集合的存储精度编码
+        queries = encode_queries(full_queries.tolist(), vector_dtype)
+        anns_field, output_fields = "embedding", []
+    exclude_ids = truth["exclude_ids"].tolist()
+    expected = truth["ids"][:, : args.top_k].tolist()
+    # 查询来自向量库时会命中自身，多取一条再去掉
+    limit = args.top_k + (1 if max(exclude_ids) >= 0 else 0)
+
+    def search(i: int) -> list[dict]:
+        hits = client.search(
+            collection_name,
+            [queries[i]],
+            anns_field=anns_field,
+            limit=limit * oversample if args.two_stage else limit,
+            output_fields=output_fields,
+            search_params=params,
+        )[0]
+        if args.two_stage:
+            return rerank(full_queries[i], list(hits), limit, vector_dtype)
+        return hits
+
+    for i in range(min(10, len(queries))):
+        search(i)
+
+    recalls: list[float] = []
+    latencies: list[float] = []
+    for i, (exclude_id, expected_ids) in enumerate(zip(exclude_ids, expected)):
+        start = time.perf_counter()
+        hits = search(i)
+        latencies.append(time.perf_counter() - start)
+        found = [hit["id"] for hit in hits if hit["id"] != exclude_id]
+        recalls.append(len(set(found[: args.top_k]) & set(expected_ids)) / args.top_k)
+
+    mode = f" 两阶段 x{oversample}" if args.two_stage else ""
+    print(
+        f"{collection_name} {json.dumps(params['params'])}{mode}: "
+        f"recall@{args.top_k}={np.mean(recalls):.4f} "
+        f"p50={np.percentile(latencies, 50) * 1000:.2f}ms "
+        f"p99={np.percentile(latencies, 99) * 1000:.2f}ms "
+        f"({len(queries)} 条查询，基准来自 {meta['source']})"
+    )
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="计算精确 top-k 并评估搜索召回率")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="计算并保存精确 top-k")
+    build_parser.add_argument("--snapshot", help="从 embedding 快照读取向量")
+    build_parser.add_argument(
+        "--collection", help="从集合导出向量，默认 MILVUS_COLLECTION_NAME"
+    )
+    queries = build_parser.add_mutually_exclusive_group()
+    queries.add_argument("--sample", type=int, default=200, help="从向量库抽样的查询数")
+    queries.add_argument("--queries-file", help="查询文本文件，每行一条")
+    build_parser.add_argument("--top-k", type=int, default=100)
+    build_parser.add_argument("--block-size", type=int, default=16384)
+    build_parser.add_argument(
+        "--output", help="输出路径，默认 .cache/ground_truth/<来源>.npz"
+    )
+
+    evaluate_parser = commands.add_parser("evaluate", help="评估线上搜索配置")
+    evaluate_parser.add_argument("--truth", required=True, help="build 生成的 .npz")
+    evaluate_parser.add_argument("--top-k", type=int, default=10)
+    evaluate_parser.add_argument(
+        "--collection", help="要评估的集合，默认 MILVUS_COLLECTION_NAME"
+    )
+    evaluate_parser.add_argument("--index-type", help="默认 MILVUS_INDEX_TYPE")
+    evaluate_parser.add_argument(
+        "--search-params", help="搜索参数 (JSON)，默认 MILVUS_SEARCH_PARAMS"
+    )
+    evaluate_parser.add_argument(
+        "--two-stage", action="store_true", help="低维粗排 + 全维重排"
+    )
+    evaluate_parser.add_argument(
+        "--oversample", type=int, help="粗排候选倍数，默认 SEARCH_OVERSAMPLE"
+    )
+
+    args = parser.parse_args()
+    settings = get_settings()
+    if args.command == "build":
+        build(args, settings)
+    else:
+        evaluate(args, settings)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,167 +3,741 @@
 将书籍内容通过 Qwen Embedding 处理后存入 Milvus (Zilliz Cloud)
 """
 
+import argparse
+import asyncio
+import itertools
 import json
+import multiprocessing
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Generator
+from functools import partial
+from typing import Any, Callable, Iterable, Iterator
 
-import httpx
-from pymilvus import MilvusClient, DataType
+from pymilvus import MilvusClient, DataType, MilvusException
 from tqdm import tqdm
 
 # 添加项目根目录到 Python 路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from config import get_settings
+from config import Settings, get_settings
+from backend.embedding import EmbeddingClient
+from backend.embedding_store import EmbeddingStore
+from backend.milvus import (
+    bump_version,
+    schema_coarse_dimension,
+    schema_vector_dtype,
+)
+from backend.rerank import COARSE_FIELD, truncate
+from backend.vector_index import (
+    METRIC_TYPE,
+    VECTOR_DTYPES,
+    build_params,
+    check_index_type,
+    check_vector_dtype,
+    decode_vectors,
+    encode_queries,
+    encode_vectors,
+    search_params,
+)
+from scripts.books import BookProgress, iter_books_parallel, resolve_sources
+from scripts.bulk_load import BulkLoader
+from scripts.checkpoint import ImportCheckpoint
+from scripts.ingest import iter_book_records, iter_pages
+from scripts.snapshot import Snapshot, SnapshotWriter
+from scripts.token_batcher import TokenBatcher
+
+
+async def get_embeddings_batch(
+    texts: list[str],
+    embedding_client: EmbeddingClient,
+    embedding_store: EmbeddingStore | None = None,
+) -> list[list[float]]:
+    """
+    批量获取文本的 embedding
+    使用阿里云 DashScope API，复用客户端连接池
+    已存在于持久化缓存中的文本不会重复调用 API
+    """
+    if embedding_store is None:
+        return await embedding_client.embed_batch(texts)
 
+    found = await asyncio.to_thread(embedding_store.get_many, texts)
+    missing = [text for text in dict.fromkeys(texts) if text not in found]
 
-def load_book_data(json_path: str) -> list[dict]:
-    """加载书籍 JSON 数据"""
-    with open(json_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    if missing:
+        embeddings = await embedding_client.embed_batch(missing)
+        new_items = list(zip(missing, embeddings))
+        await asyncio.to_thread(embedding_store.put_many, new_items)
+        found.update(new_items)
 
+    return [found[text] for text in texts]
 
-def preprocess_data(raw_data: list[dict], book_name: str) -> list[dict]:
-    """
-    预处理数据：按逻辑页码合并内容，过滤逻辑页码为空的条目
 
-    返回格式: [{"page": "逻辑页码", "content": "合并后的内容", "book": "书名"}, ...]
+def build_schema(
+    client: MilvusClient,
+    dimension: int,
+    vector_dtype: str = "float32",
+    coarse_dimension: int = 0,
+    partition_key: bool = False,
+):
     """
-    # 按逻辑页码分组
-    pages: dict[str, list[str]] = {}
+    集合 schema (主键由导入脚本确定性生成，重复导入可幂等 upsert)
 
-    for item in raw_data:
-        page = item.get("逻辑页码", "").strip()
-        content = item.get("内容", "").strip()
+    vector_dtype 为 float16 / bfloat16 时向量字段以半精度存储，内存与磁盘占用减半；
+    coarse_dimension > 0 时增加两阶段检索使用的低维粗排向量字段；
+    partition_key 为 True 时书名作为分区键，按书过滤的查询只扫描该书所在的分区
+    """
+    field_type, _ = VECTOR_DTYPES[check_vector_dtype(vector_dtype)]
+    schema = client.create_schema(auto_id=False, enable_dynamic_field=True)
 
-        # 丢弃逻辑页码为空或内容为空的条目
-        if not page or not content:
-            continue
+    schema.add_field(
+        field_name="id", datatype=DataType.INT64, is_primary=True, auto_id=False
+    )
+    schema.add_field(
+        field_name="embedding", datatype=DataType[field_type], dim=dimension
+    )
+    if coarse_dimension:
+        schema.add_field(
+            field_name=COARSE_FIELD,
+            datatype=DataType[field_type],
+            dim=coarse_dimension,
+        )
+    schema.add_field(field_name="content", datatype=DataType.VARCHAR, max_length=65535)
+    schema.add_field(field_name="page", datatype=DataType.VARCHAR, max_length=50)
+    schema.add_field(
+        field_name="book",
+        datatype=DataType.VARCHAR,
+        max_length=255,
+        is_partition_key=partition_key,
+    )
+    schema.add_field(
+        field_name="content_hash", datatype=DataType.VARCHAR, max_length=64
+    )
+    return schema
 
-        if page not in pages:
-            pages[page] = []
-        pages[page].append(content)
-
-    # 合并同一逻辑页的内容
-    processed = []
-    for page, contents in pages.items():
-        merged_content = "\n".join(contents)
-        if len(merged_content) > 10:  # 过滤太短的内容
-            processed.append(
-                {"page": page, "content": merged_content, "book": book_name}
-            )
 
-    return processed
+def build_index_params(
+    client: MilvusClient,
+    index_type: str = "AUTOINDEX",
+    params: dict | None = None,
+    coarse: bool = False,
+):
+    """向量索引参数 (未指定的构建参数使用该索引类型的默认值，粗排字段使用相同配置)"""
+    index_params = client.prepare_index_params()
+    for field_name in ("embedding", COARSE_FIELD) if coarse else ("embedding",):
+        index_params.add_index(
+            field_name=field_name,
+            index_type=check_index_type(index_type),
+            metric_type=METRIC_TYPE,
+            params=build_params(index_type, params),
+        )
+    return index_params
 
 
-def get_embeddings_batch(
-    texts: list[str], api_key: str, model: str = "text-embedding-v4"
-) -> list[list[float]]:
+def create_collection(
+    client: MilvusClient,
+    collection_name: str,
+    dimension: int,
+    with_index: bool = True,
+    index_type: str = "AUTOINDEX",
+    index_params: dict | None = None,
+    vector_dtype: str = "float32",
+    coarse_dimension: int = 0,
+    book_partitions: int = 0,
+):
     """
-    批量获取文本的 embedding
-    使用阿里云 DashScope API
+    创建 Milvus 集合
+
+    with_index=False 时只创建集合，不建索引也不加载，
+    数据全部写入后再调用 build_index，避免边写入边构建索引；
+    book_partitions > 0 时以书名为分区键，书名按哈希分配到这么多个分区
     """
-    url = "https://dashscope.aliyuncs.com/compatible-mode/v1/embeddings"
+    # 检查集合是否存在
+    if client.has_collection(collection_name):
+        print(f"集合 {collection_name} 已存在，将删除并重新创建")
+        client.drop_collection(collection_name)
 
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+    schema = build_schema(
+        client, dimension, vector_dtype, coarse_dimension, book_partitions > 0
+    )
+    options = {"num_partitions": book_partitions} if book_partitions else {}
 
-    data = {"model": model, "input": texts, "encoding_format": "float"}
+    # 创建集合
+    if with_index:
+        client.create_collection(
+            collection_name=collection_name,
+            schema=schema,
+            index_params=build_index_params(
+                client, index_type, index_params, coarse=coarse_dimension > 0
+            ),
+            **options,
+        )
+    else:
+        client.create_collection(
+            collection_name=collection_name, schema=schema, **options
+        )
 
-    with httpx.Client(timeout=60.0) as client:
-        response = client.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        result = response.json()
+    print(f"集合 {collection_name} 创建成功")
 
-    # 按 index 排序确保顺序正确
-    embeddings_data = sorted(result["data"], key=lambda x: x["index"])
-    return [item["embedding"] for item in embeddings_data]
 
+def build_index(
+    client: MilvusClient,
+    collection_name: str,
+    index_type: str = "AUTOINDEX",
+    index_params: dict | None = None,
+):
+    """数据写入完成后封存数据段、构建向量索引并加载集合"""
+    if not client.list_indexes(collection_name):
+        start = time.perf_counter()
+        client.flush(collection_name)
+        coarse = collection_coarse_dimension(client, collection_name) > 0
+        client.create_index(
+            collection_name,
+            build_index_params(client, index_type, index_params, coarse=coarse),
+        )
+        print(
+            f"集合 {collection_name} 索引构建完成，耗时 {time.perf_counter() - start:.1f}s"
+        )
+
+    client.load_collection(collection_name)
+
+
+def fetch_existing_pages(
+    client: MilvusClient, collection_name: str, books: list[str]
+) -> list[dict]:
+    """分批读取集合中指定书籍已存储的主键、书名、页码与内容哈希"""
+    iterator = client.query_iterator(
+        collection_name,
+        batch_size=1000,
+        filter=f"book in {json.dumps(books, ensure_ascii=False)}",
+        output_fields=["id", "book", "page", "content_hash"],
+    )
+    rows: list[dict] = []
+    try:
+        while batch := iterator.next():
+            rows.extend(batch)
+    finally:
+        iterator.close()
+    return rows
 
-def batch_generator(data: list, batch_size: int) -> Generator[list, None, None]:
-    """将数据分批生成"""
-    for i in range(0, len(data), batch_size):
-        yield data[i : i + batch_size]
 
+class PageDiff:
+    """
+    流式对比已存储的数据与预处理结果
 
-def create_collection(client: MilvusClient, collection_name: str, dimension: int):
-    """创建 Milvus 集合"""
-    # 检查集合是否存在
-    if client.has_collection(collection_name):
-        print(f"集合 {collection_name} 已存在，将删除并重新创建")
-        client.drop_collection(collection_name)
+    主键由 (书名, 页码, 内容哈希) 决定，内容变化的页面主键也会变化；
+    filter 只放行需要 embedding 并写入的页面，遍历结束后 stale_ids 给出需要删除的主键；
+    给定 batcher 时未变化的页面按同样的条数与 token 上限打包计数，估算节省的 API 调用次数
+    """
 
-    # 创建集合 schema
-    schema = client.create_schema(auto_id=True, enable_dynamic_field=True)
+    def __init__(self, existing: list[dict], batcher: TokenBatcher | None = None):
+        self.batcher = batcher
+        self.existing_ids = {row["id"] for row in existing}
+        self.existing_pages = {(row["book"], row["page"]) for row in existing}
+        self.seen_ids: set[int] = set()
+        self.seen_pages: set[tuple[str, str]] = set()
+        self.unchanged = 0
+        self.added = 0
+        self.changed = 0
+
+    def filter(self, pages: Iterable[dict]) -> Iterator[dict]:
+        """过滤掉未变化的页面"""
+        for item in pages:
+            self.seen_ids.add(item["id"])
+            self.seen_pages.add((item["book"], item["page"]))
+
+            if item["id"] in self.existing_ids:
+                self.unchanged += 1
+                if self.batcher:
+                    self.batcher.add(item)
+                continue
+
+            if (item["book"], item["page"]) in self.existing_pages:
+                self.changed += 1
+            else:
+                self.added += 1
+            yield item
+
+        if self.batcher:
+            self.batcher.flush()
+
+    def stale_ids(self) -> list[int]:
+        """已不存在或内容已被替换的页面主键"""
+        return list(self.existing_ids - self.seen_ids)
+
+    def summary(self) -> dict:
+        """差异统计"""
+        return {
+            "unchanged": self.unchanged,
+            "added": self.added,
+            "changed": self.changed,
+            "removed": len(self.existing_pages - self.seen_pages),
+            "saved_batches": self.batcher.batches if self.batcher else 0,
+        }
+
+
+def versioned_collection_name(alias: str) -> str:
+    """为一次全量导入生成带时间戳的物理集合名"""
+    return f"{alias}_v{time.strftime('%Y%m%d%H%M%S')}"
+
+
+def resolve_alias(client: MilvusClient, alias: str) -> str | None:
+    """返回别名当前指向的集合，不是别名时返回 None"""
+    try:
+        return client.describe_alias(alias)["collection_name"]
+    except MilvusException:
+        return None
+
+
+def collection_vector_dtype(client: MilvusClient, collection_name: str) -> str:
+    """从集合 schema 读取向量字段的存储精度 (已有集合以实际类型为准，不看当前配置)"""
+    return schema_vector_dtype(client.describe_collection(collection_name))
+
+
+def collection_coarse_dimension(client: MilvusClient, collection_name: str) -> int:
+    """集合中粗排向量字段的维度，没有该字段时返回 0"""
+    return schema_coarse_dimension(client.describe_collection(collection_name))
+
+
+def add_coarse_embeddings(
+    write: Callable[[list[dict]], Any], coarse_dimension: int
+) -> Callable[[list[dict]], Any]:
+    """包装写入函数：整批截断全维向量生成粗排向量，随行一起写入"""
+    if not coarse_dimension:
+        return write
+
+    def write_with_coarse(rows: list[dict]):
+        coarse = truncate([row["embedding"] for row in rows], coarse_dimension)
+        return write(
+            [
+                {**row, COARSE_FIELD: vector}
+                for row, vector in zip(rows, coarse.tolist())
+            ]
+        )
+
+    return write_with_coarse
+
+
+def encode_embeddings(
+    write: Callable[[list[dict]], Any], vector_dtype: str
+) -> Callable[[list[dict]], Any]:
+    """
+    包装写入函数：整批行的向量先用 NumPy 一次性转换为集合的存储精度再写入
 
-    schema.add_field(
-        field_name="id", datatype=DataType.INT64, is_primary=True, auto_id=True
+    只替换传给 Milvus 的行，调用方 (快照等) 拿到的仍是原始 float 列表
+    """
+    if check_vector_dtype(vector_dtype) == "float32":
+        return write
+
+    def write_encoded(rows: list[dict]):
+        rows = [dict(row) for row in rows]
+        for field_name in ("embedding", COARSE_FIELD):
+            if rows and field_name in rows[0]:
+                vectors = encode_vectors(
+                    [row[field_name] for row in rows], vector_dtype
+                )
+                for row, vector in zip(rows, vectors):
+                    row[field_name] = vector
+        return write(rows)
+
+    return write_encoded
+
+
+def verify_collection(
+    client: MilvusClient,
+    collection_name: str,
+    expected_rows: int,
+    search_params: dict | None = None,
+):
+    """切换前校验新集合：行数与预期一致，且用库中向量搜索能命中自身"""
+    client.flush(collection_name)
+    (result,) = client.query(
+        collection_name,
+        filter="",
+        output_fields=["count(*)"],
+        consistency_level="Strong",
     )
-    schema.add_field(
-        field_name="embedding", datatype=DataType.FLOAT_VECTOR, dim=dimension
+    row_count = result["count(*)"]
+    if row_count != expected_rows:
+        raise RuntimeError(
+            f"集合 {collection_name} 行数校验失败: 预期 {expected_rows}，实际 {row_count}"
+        )
+
+    sample = client.query(
+        collection_name,
+        filter="",
+        output_fields=["id", "embedding"],
+        limit=1,
+        consistency_level="Strong",
     )
-    schema.add_field(field_name="content", datatype=DataType.VARCHAR, max_length=65535)
-    schema.add_field(field_name="page", datatype=DataType.VARCHAR, max_length=50)
-    schema.add_field(field_name="book", datatype=DataType.VARCHAR, max_length=255)
+    if sample:
+        vector_dtype = collection_vector_dtype(client, collection_name)
+        vector = decode_vectors([sample[0]["embedding"]], vector_dtype)
+        # 近似索引 (如 IVF_PQ) 不保证自身排在第一，只要求出现在前 10 条中
+        hits = client.search(
+            collection_name=collection_name,
+            data=encode_queries(vector, vector_dtype),
+            anns_field="embedding",
+            limit=10,
+            search_params=search_params or {"metric_type": METRIC_TYPE},
+        )
+        if not hits or sample[0]["id"] not in {hit["id"] for hit in hits[0]}:
+            raise RuntimeError(f"集合 {collection_name} 冒烟查询校验失败")
+
+    print(f"集合 {collection_name} 校验通过: {row_count} 条数据")
+
+
+def swap_alias(client: MilvusClient, alias: str, collection_name: str):
+    """将别名原子地切换到新集合"""
+    if resolve_alias(client, alias):
+        client.alter_alias(collection_name=collection_name, alias=alias)
+    else:
+        if client.has_collection(alias):
+            # 旧版本直接以别名同名创建了集合，只能先删除再建立别名
+            print(f"集合 {alias} 不是别名，将删除后改为别名")
+            client.drop_collection(alias)
+        client.create_alias(collection_name=collection_name, alias=alias)
+
+    print(f"别名 {alias} 已指向 {collection_name}")
+
+
+def gc_old_versions(
+    client: MilvusClient, alias: str, current: str, grace_period: float
+):
+    """
+    清理旧版本集合
 
-    # 创建索引参数
-    index_params = client.prepare_index_params()
-    index_params.add_index(
-        field_name="embedding", index_type="AUTOINDEX", metric_type="COSINE"
+    始终保留当前集合和上一个版本 (用于回滚)；
+    更早的版本在被替换超过 grace_period 秒后删除，
+    被替换时间以下一个版本的创建时间 (集合名中的时间戳) 计
+    """
+    prefix = f"{alias}_v"
+    versions = sorted(
+        name for name in client.list_collections() if name.startswith(prefix)
     )
+    if current not in versions:
+        return
+
+    position = versions.index(current)
+    for older, successor in zip(versions[: position - 1], versions[1:position]):
+        try:
+            replaced_at = time.mktime(
+                time.strptime(successor[len(prefix) :], "%Y%m%d%H%M%S")
+            )
+        except ValueError:
+            continue
+        if time.time() - replaced_at > grace_period:
+            client.drop_collection(older)
+            print(f"已删除旧版本集合 {older}")
 
-    # 创建集合
-    client.create_collection(
-        collection_name=collection_name, schema=schema, index_params=index_params
-    )
 
-    print(f"集合 {collection_name} 创建成功")
+# 每次从数据源读取的页面数 (在工作线程中读取)
+FEED_CHUNK_SIZE = 64
 
 
-def import_data_to_milvus(
-    data: list[dict],
-    client: MilvusClient,
-    collection_name: str,
-    api_key: str,
-    embedding_model: str,
-    batch_size: int = 20,
-):
-    """将数据导入到 Milvus"""
-    total_batches = (len(data) + batch_size - 1) // batch_size
+def take(iterator: Iterator, count: int) -> list:
+    """从迭代器中取出至多 count 个元素"""
+    return list(itertools.islice(iterator, count))
 
-    for batch in tqdm(
-        batch_generator(data, batch_size), total=total_batches, desc="导入数据"
-    ):
-        # 提取文本内容
-        texts = [item["content"] for item in batch]
 
-        # 获取 embeddings
-        embeddings = get_embeddings_batch(texts, api_key, embedding_model)
+async def embed_stage(
+    batches: asyncio.Queue,
+    rows: asyncio.Queue,
+    embedding_client: EmbeddingClient,
+    embedding_store: EmbeddingStore | None,
+):
+    """Embedding 阶段：从 batches 取出一批页面，获取 embedding 后放入 rows"""
+    while (batch := await batches.get()) is not None:
+        texts = [item["content"] for item in batch]
+        embeddings = await get_embeddings_batch(
+            texts, embedding_client, embedding_store
+        )
 
-        # 准备插入数据
-        insert_data = []
-        for item, embedding in zip(batch, embeddings):
-            insert_data.append(
+        await rows.put(
+            [
                 {
+                    "id": item["id"],
                     "embedding": embedding,
                     "content": item["content"],
                     "page": item["page"],
                     "book": item["book"],
+                    "content_hash": item["content_hash"],
                 }
-            )
+                for item, embedding in zip(batch, embeddings)
+            ]
+        )
+
+
+async def insert_stage(
+    rows: asyncio.Queue,
+    write: Callable[[list[dict]], Any],
+    insert_batch_size: int,
+    progress: tqdm,
+    checkpoint: ImportCheckpoint | None = None,
+    books: BookProgress | None = None,
+):
+    """
+    插入阶段：攒够 insert_batch_size 条后调用 write 写入，与 embedding 请求并行
+    每批写入成功后记录断点和各书进度
+    """
+    pending: list[dict] = []
+
+    async def flush():
+        await asyncio.to_thread(write, pending)
+        if checkpoint:
+            await asyncio.to_thread(checkpoint.record, [row["id"] for row in pending])
+        progress.update(len(pending))
+        if books:
+            books.record(pending)
+        pending.clear()
+
+    while (batch := await rows.get()) is not None:
+        pending.extend(batch)
+        if len(pending) >= insert_batch_size:
+            await flush()
+
+    if pending:
+        await flush()
+
+
+async def import_data_to_milvus(
+    data: Iterable[dict],
+    write: Callable[[list[dict]], Any],
+    embedding_client: EmbeddingClient,
+    batcher: TokenBatcher,
+    embed_concurrency: int = 4,
+    queue_size: int = 16,
+    insert_batch_size: int = 500,
+    embedding_store: EmbeddingStore | None = None,
+    checkpoint: ImportCheckpoint | None = None,
+    books: BookProgress | None = None,
+) -> int:
+    """
+    将数据导入到 Milvus，返回导入条数
+
+    流水线结构：embed_concurrency 个 embedding 任务并发请求 API，
+    结果经有界队列交给单独的插入任务，Milvus 写入与 embedding 请求重叠进行；
+    data 可以是生成器，在工作线程中按需读取 (文件读取、等待预处理进程不阻塞事件循环)，
+    内存占用只取决于队列深度；
+    页面由 batcher 按条数和估算 token 数打包后发送；
+    write 负责写入一批行 (Milvus insert/upsert 或批量导入文件)
+    """
+    batches: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    rows: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    total = len(data) if isinstance(data, list) else None
+    with tqdm(total=total, desc="导入数据") as progress:
+        try:
+            async with asyncio.TaskGroup() as tg:
+                inserter = tg.create_task(
+                    insert_stage(
+                        rows,
+                        write,
+                        insert_batch_size,
+                        progress,
+                        checkpoint,
+                        books,
+                    )
+                )
+                embedders = [
+                    tg.create_task(
+                        embed_stage(batches, rows, embedding_client, embedding_store)
+                    )
+                    for _ in range(embed_concurrency)
+                ]
+
+                iterator = iter(data)
+                while chunk := await asyncio.to_thread(take, iterator, FEED_CHUNK_SIZE):
+                    for page in chunk:
+                        for batch in batcher.add(page):
+                            await batches.put(batch)
+                for batch in batcher.flush():
+                    await batches.put(batch)
+                for _ in embedders:
+                    await batches.put(None)
+
+                await asyncio.wait(embedders)
+                await rows.put(None)
+                await inserter
+        except ExceptionGroup as eg:
+            # 任一阶段失败时其余任务已被取消，只抛出首个错误
+            raise eg.exceptions[0]
+
+    stats = batcher.stats()
+    print(f"成功导入 {progress.n} 条数据")
+    print(
+        f"Embedding 批次 {stats['batches']} 个，平均每批 {stats['avg_items']:.1f} 条 / "
+        f"{stats['avg_tokens']:.0f} tokens，条数填充率 {stats['item_fill']:.0%}，"
+        f"token 填充率 {stats['token_fill']:.0%}，拆分超长页面 {stats['split_pages']} 个"
+    )
+    return progress.n
+
+
+async def run_import(
+    settings: Settings,
+    data: Iterable[dict],
+    write: Callable[[list[dict]], Any],
+    embedding_store: EmbeddingStore | None,
+    batcher: TokenBatcher,
+    checkpoint: ImportCheckpoint | None = None,
+    books: BookProgress | None = None,
+) -> int:
+    """
+    在事件循环中运行导入流水线
+    整个导入过程 (包括多本书) 共享同一个 Embedding 连接池、限流器和插入队列
+    """
+    embedding_client = EmbeddingClient(settings, timeout=60.0)
+    try:
+        return await import_data_to_milvus(
+            data,
+            write,
+            embedding_client,
+            batcher,
+            embed_concurrency=settings.import_embed_concurrency,
+            queue_size=settings.import_queue_size,
+            insert_batch_size=settings.import_insert_batch_size,
+            embedding_store=embedding_store,
+            checkpoint=checkpoint,
+            books=books,
+        )
+    finally:
+        stats = embedding_client.stats()
+        print(
+            f"Embedding API: 成功 {stats['successes']} 次，重试 {stats['retries']} 次，"
+            f"限流 (429) {stats['throttled']} 次，"
+            f"本地限流等待 {stats['limiter']['wait_time']:.1f} 秒"
+        )
+        await embedding_client.aclose()
+
+
+def publish_collection(
+    client: MilvusClient, settings: Settings, alias: str, target: str, rows: int
+):
+    """构建索引并校验新集合后切换别名，并清理过期的旧版本"""
+    build_index(
+        client, target, settings.milvus_index_type, settings.milvus_index_params
+    )
+    verify_collection(
+        client,
+        target,
+        rows,
+        search_params(settings.milvus_index_type, settings.milvus_search_params),
+    )
+    swap_alias(client, alias, target)
+    gc_old_versions(client, alias, target, settings.milvus_gc_grace_period)
 
-        # 插入数据
-        client.insert(collection_name=collection_name, data=insert_data)
 
-    print(f"成功导入 {len(data)} 条数据")
+def restore_snapshot(
+    client: MilvusClient,
+    settings: Settings,
+    alias: str,
+    path: str,
+    bulk: bool = False,
+):
+    """
+    从 embedding 快照重建集合，不调用 Embedding API
+
+    与全量导入一样写入新的版本集合后切换别名，可用于更换索引类型或迁移到其他集群
+    """
+    snapshot = Snapshot(path)
+    manifest = snapshot.manifest
+    if not manifest.get("complete"):
+        raise RuntimeError(f"快照 {path} 未完成，不能用于恢复")
+    if (manifest["model"], manifest["dimension"]) != (
+        settings.embedding_model,
+        settings.embedding_dimension,
+    ):
+        raise RuntimeError(
+            f"快照的模型与维度 ({manifest['model']}, {manifest['dimension']}) "
+            f"与当前配置 ({settings.embedding_model}, "
+            f"{settings.embedding_dimension}) 不一致"
+        )
+
+    target = versioned_collection_name(alias)
+    create_collection(
+        client,
+        target,
+        settings.embedding_dimension,
+        with_index=not settings.import_defer_index,
+        index_type=settings.milvus_index_type,
+        index_params=settings.milvus_index_params,
+        vector_dtype=settings.milvus_vector_dtype,
+        coarse_dimension=settings.embedding_coarse_dimension,
+        book_partitions=settings.milvus_book_partitions,
+    )
+
+    bulk_loader = None
+    if bulk:
+        bulk_loader = BulkLoader(
+            settings,
+            build_schema(
+                client,
+                settings.embedding_dimension,
+                settings.milvus_vector_dtype,
+                settings.embedding_coarse_dimension,
+                settings.milvus_book_partitions > 0,
+            ),
+            target,
+        )
+        write = bulk_loader.write
+    else:
+        write = encode_embeddings(
+            partial(client.insert, target), settings.milvus_vector_dtype
+        )
+    write = add_coarse_embeddings(write, settings.embedding_coarse_dimension)
+
+    try:
+        with tqdm(total=manifest["rows"], desc="从快照恢复") as progress:
+            for rows in snapshot.iter_rows(settings.import_insert_batch_size):
+                write(rows)
+                progress.update(len(rows))
+        imported = progress.n
+        if bulk_loader:
+            imported = bulk_loader.finish()
+    finally:
+        if bulk_loader:
+            bulk_loader.close()
+
+    print(f"已从快照恢复 {imported} 条数据")
+    publish_collection(client, settings, alias, target, imported)
 
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="导入书籍数据到 Milvus")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--fresh", action="store_true", help="忽略断点，从头构建新版本集合"
+    )
+    mode.add_argument(
+        "--incremental",
+        action="store_true",
+        help="增量导入：只写入新增或内容变化的页面，并删除已不存在的页面",
+    )
+    mode.add_argument(
+        "--from-snapshot",
+        metavar="PATH",
+        help="从 embedding 快照目录重建集合，不调用 Embedding API",
+    )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="全量导入时写入 Parquet 分片并通过 Milvus 批量导入接口加载",
+    )
+    parser.add_argument(
+        "--source",
+        help="书籍文件、目录或 glob 模式 (如 'books/*.json')，书名取文件名；"
+        "默认读取项目根目录下的 {BOOK_NAME}.json 或 .jsonl",
+    )
+    args = parser.parse_args()
+    if args.bulk and args.incremental:
+        parser.error("--bulk 只能用于全量导入，不能与 --incremental 同时使用")
+
     settings = get_settings()
 
-    # 验证配置
-    if not settings.dashscope_api_key:
+    # 验证配置 (从快照恢复不需要调用 Embedding API)
+    if not args.from_snapshot and not settings.dashscope_api_key:
         print("错误: 请设置 DASHSCOPE_API_KEY 环境变量")
         sys.exit(1)
 
@@ -171,44 +745,233 @@ def main():
         print("错误: 请设置 ZILLIZ_CLOUD_URI 和 ZILLIZ_CLOUD_TOKEN 环境变量")
         sys.exit(1)
 
-    # 数据文件路径
-    project_root = Path(__file__).parent.parent
-    json_file = project_root / f"{settings.book_name}.json"
-
-    if not json_file.exists():
-        print(f"错误: 找不到数据文件 {json_file}")
-        sys.exit(1)
-
-    print(f"正在加载数据文件: {json_file}")
-
-    # 加载和预处理数据
-    raw_data = load_book_data(str(json_file))
-    print(f"原始数据条数: {len(raw_data)}")
-
-    processed_data = preprocess_data(raw_data, settings.book_name)
-    print(f"预处理后数据条数: {len(processed_data)}")
-
     # 连接 Milvus
     print(f"正在连接 Zilliz Cloud: {settings.zilliz_cloud_uri}")
     client = MilvusClient(
         uri=settings.zilliz_cloud_uri, token=settings.zilliz_cloud_token
     )
+    alias = settings.milvus_collection_name
+
+    if args.from_snapshot:
+        restore_snapshot(client, settings, alias, args.from_snapshot, args.bulk)
+        bump_version(client, alias)
+        print("数据导入完成!")
+        return
+
+    # 数据文件路径 (支持 JSON 数组与 JSONL)
+    if args.source:
+        book_files = resolve_sources(args.source)
+        missing = args.source
+    else:
+        project_root = Path(__file__).parent.parent
+        candidates = [
+            project_root / f"{settings.book_name}{ext}" for ext in (".json", ".jsonl")
+        ]
+        book_files = [path for path in candidates if path.exists()][:1]
+        missing = candidates[0]
+
+    if not book_files:
+        print(f"错误: 找不到数据文件 {missing}")
+        sys.exit(1)
 
-    # 创建集合
-    create_collection(
-        client, settings.milvus_collection_name, settings.embedding_dimension
-    )
+    book_names = [path.stem for path in book_files]
+    if len(set(book_names)) != len(book_names):
+        print("错误: 存在同名书籍文件，书名取自文件名，必须唯一")
+        sys.exit(1)
 
-    # 导入数据
-    import_data_to_milvus(
-        processed_data,
-        client,
-        settings.milvus_collection_name,
-        settings.dashscope_api_key,
-        settings.embedding_model,
-        batch_size=10,
+    # 超长页面在按主键过滤 (断点续传、增量对比) 之前拆分，保证主键与写入时一致
+    batcher = TokenBatcher(
+        max_items=settings.import_embed_batch_size,
+        max_tokens=settings.import_embed_batch_tokens,
+        max_item_tokens=settings.import_embed_item_tokens,
     )
+    executor = None
+    if len(book_files) == 1:
+        # 单本书流式读取并按逻辑页合并，内存占用与文件大小无关
+        print(f"正在流式读取数据文件: {book_files[0]}")
+        pages = batcher.split_oversized(
+            iter_pages(iter_book_records(book_files[0]), book_names[0])
+        )
+    else:
+        # 多本书在进程池中并行预处理，所有书共享同一条导入流水线
+        print(
+            f"共 {len(book_files)} 本书，"
+            f"使用 {settings.import_book_workers} 个进程并行预处理"
+        )
+        # 主进程已持有 gRPC 连接，子进程使用 spawn 启动，避免 fork 继承其线程状态
+        executor = ProcessPoolExecutor(
+            max_workers=settings.import_book_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        pages = iter_books_parallel(
+            book_files,
+            executor,
+            batcher,
+            max_in_flight=settings.import_book_workers * 2,
+        )
+
+    checkpoint = ImportCheckpoint(
+        Path(settings.import_checkpoint_dir) / f"{alias}.jsonl"
+    )
+    if args.fresh:
+        checkpoint.reset()
+
+    # 全量导入写入新的版本集合，完成并校验后再切换别名，导入期间线上查询不受影响
+    target = alias
+    resume_target = None
+    diff = None
+    bulk_loader = None
+
+    if args.incremental and client.has_collection(alias):
+        # 读取已有数据前确保集合已加载 (实例重启后集合可能处于未加载状态)
+        client.load_collection(alias)
+        diff = PageDiff(
+            fetch_existing_pages(client, alias, book_names),
+            TokenBatcher(
+                max_items=settings.import_embed_batch_size,
+                max_tokens=settings.import_embed_batch_tokens,
+                max_item_tokens=settings.import_embed_item_tokens,
+            ),
+        )
+        pages = diff.filter(pages)
+        write = partial(client.upsert, alias)
+        vector_dtype = collection_vector_dtype(client, alias)
+        coarse_dimension = collection_coarse_dimension(client, alias)
+
+        # 增量导入直接修改线上集合，本身可以重复执行，不需要断点
+        checkpoint = None
+    elif (
+        not args.bulk
+        and (resume_target := checkpoint.collection())
+        and client.has_collection(resume_target)
+    ):
+        target = resume_target
+        done = checkpoint.load()
+        pages = (item for item in pages if item["id"] not in done)
+        print(f"检测到未完成的导入 ({target})，跳过已完成的 {len(done)} 条")
+
+        # 中断前的最后一批可能已写入但未记录断点，续传时使用 upsert 避免重复行
+        write = partial(client.upsert, target)
+        vector_dtype = collection_vector_dtype(client, target)
+        coarse_dimension = collection_coarse_dimension(client, target)
+    else:
+        target = versioned_collection_name(alias)
+        vector_dtype = settings.milvus_vector_dtype
+        coarse_dimension = settings.embedding_coarse_dimension
+
+        # 可选先不建索引，数据全部写入后再统一构建
+        create_collection(
+            client,
+            target,
+            settings.embedding_dimension,
+            with_index=not settings.import_defer_index,
+            index_type=settings.milvus_index_type,
+            index_params=settings.milvus_index_params,
+            vector_dtype=settings.milvus_vector_dtype,
+            coarse_dimension=settings.embedding_coarse_dimension,
+            book_partitions=settings.milvus_book_partitions,
+        )
+        if args.bulk:
+            # 批量导入的数据在任务完成前不可见，逐批断点没有意义；
+            # 重新运行时已生成的 embedding 可从持久化缓存读取
+            checkpoint.reset()
+            checkpoint = None
+            bulk_loader = BulkLoader(
+                settings,
+                build_schema(
+                    client,
+                    settings.embedding_dimension,
+                    settings.milvus_vector_dtype,
+                    settings.embedding_coarse_dimension,
+                    settings.milvus_book_partitions > 0,
+                ),
+                target,
+            )
+            write = bulk_loader.write
+        else:
+            checkpoint.start(target)
+            write = partial(client.insert, target)
+
+    # 半精度集合整批转换后再写入 (批量导入由 bulk writer 按 schema 转换)；
+    # 有粗排字段时整批截断生成低维向量
+    if not bulk_loader:
+        write = encode_embeddings(write, vector_dtype)
+    write = add_coarse_embeddings(write, coarse_dimension)
+
+    # 全量导入同时保存 embedding 快照，之后重建集合无需再调用 API；
+    # 续传时只有快照从头记录才继续写入，否则快照不完整
+    snapshot = None
+    if target != alias and settings.import_snapshot_dir:
+        snapshot_path = Path(settings.import_snapshot_dir) / target
+        if target == resume_target and not SnapshotWriter.exists(snapshot_path):
+            print("本次导入开始时未保存快照，续传不再保存")
+        else:
+            snapshot = SnapshotWriter(
+                snapshot_path, settings.embedding_model, settings.embedding_dimension
+            )
+            write = snapshot.wrap(write)
 
+    # 按书统计进度 (在断点、增量过滤之后，只统计实际需要写入的页面)
+    books = BookProgress()
+    pages = books.track(pages)
+
+    # 导入数据
+    embedding_store = None
+    if settings.embedding_store_path:
+        embedding_store = EmbeddingStore(
+            settings.embedding_store_path,
+            settings.embedding_model,
+            settings.embedding_dimension,
+            max_rows=settings.embedding_store_max_rows,
+            ttl=settings.embedding_store_ttl,
+        )
+    try:
+        imported = asyncio.run(
+            run_import(
+                settings, pages, write, embedding_store, batcher, checkpoint, books
+            )
+        )
+        books.report()
+        if bulk_loader:
+            imported = bulk_loader.finish()
+        if snapshot:
+            snapshot.finish()
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+        if embedding_store:
+            embedding_store.close()
+        if bulk_loader:
+            bulk_loader.close()
+
+    # 增量导入：删除已不存在的页面并输出差异统计
+    if diff:
+        summary = diff.summary()
+        stale_ids = diff.stale_ids()
+        if stale_ids:
+            client.delete(collection_name=alias, ids=stale_ids)
+
+        # 未变化页面按同样的条数与 token 上限打包后的批次数即节省的调用次数
+        needed_calls = batcher.stats()["batches"]
+        saved_calls = summary["saved_batches"]
+        print(
+            f"增量导入: 新增 {summary['added']} 页，修改 {summary['changed']} 页，"
+            f"删除 {summary['removed']} 页，未变化 {summary['unchanged']} 页，"
+            f"清理过期数据 {len(stale_ids)} 条"
+        )
+        print(f"调用 Embedding API {needed_calls} 次，节省约 {saved_calls} 次")
+
+    # 全量导入：构建索引并校验新集合后切换别名，并清理过期的旧版本
+    if target != alias:
+        expected_rows = len(checkpoint.load()) if checkpoint else imported
+        publish_collection(client, settings, alias, target, expected_rows)
+
+    # 集合内容已变化，写入新版本号使后端的搜索结果缓存失效
+    bump_version(client, alias)
+
+    # 导入完成，清除断点
+    if checkpoint:
+        checkpoint.reset()
     print("数据导入完成!")
 
 
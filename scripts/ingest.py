@@ -0,0 +1,152 @@
+"""
+书籍数据流式读取
+逐条解析 JSON 数组 / JSONL 文件，并在逻辑页码变化时立即产出合并后的页面，
+内存占用与文件大小无关
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+from backend.embedding_store import content_hash
+
+# 每次从文件读取的字符数
+CHUNK_SIZE = 1 << 20
+
+# 数字中可能出现的字符：数字后紧跟这些字符说明数字可能被截断在缓冲区末尾
+NUMBER_CHARS = frozenset("0123456789+-.eE")
+
+
+def iter_json_array(path: str | Path, chunk_size: int = CHUNK_SIZE) -> Iterator[Any]:
+    """增量解析顶层为数组的 JSON 文件，逐个产出数组元素"""
+    decoder = json.JSONDecoder()
+
+    with open(path, "r", encoding="utf-8-sig") as f:
+        buffer, pos, eof = "", 0, False
+        state = "start"  # start -> first/value -> separator -> ... -> end
+
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+
+            if pos >= len(buffer):
+                if eof:
+                    break
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+
+            char = buffer[pos]
+            if state == "end":
+                raise ValueError(f"{path}: JSON 数组结束后存在多余内容")
+            if state == "start":
+                if char != "[":
+                    raise ValueError(f"{path}: JSON 文件顶层必须是数组")
+                pos += 1
+                state = "first"
+            elif state == "separator":
+                if char == "]":
+                    pos += 1
+                    state = "end"
+                    continue
+                if char != ",":
+                    raise ValueError(f"{path}: 数组元素之间缺少逗号")
+                pos += 1
+                state = "value"
+            else:
+                if state == "first" and char == "]":
+                    pos += 1
+                    state = "end"
+                    continue
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    value, end = None, len(buffer)
+
+                # 元素可能被截断在缓冲区末尾 (数字被截断时仍能解析出前半段)，
+                # 读入更多内容后重新解析
+                if not eof and (end >= len(buffer) or buffer[end] in NUMBER_CHARS):
+                    chunk = f.read(chunk_size)
+                    eof = not chunk
+                    buffer, pos = buffer[pos:] + chunk, 0
+                    continue
+
+                yield value
+                pos = end
+                state = "separator"
+
+    if state != "end":
+        raise ValueError(f"{path}: JSON 数组不完整")
+
+
+def iter_jsonl(path: str | Path) -> Iterator[Any]:
+    """逐行解析 JSONL 文件，跳过空行"""
+    with open(path, "r", encoding="utf-8-sig") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_book_records(path: str | Path) -> Iterator[dict]:
+    """按扩展名选择解析方式，逐条产出原始记录"""
+    if Path(path).suffix == ".jsonl":
+        return iter_jsonl(path)
+    return iter_json_array(path)
+
+
+def page_id(book: str, page: str, digest: str) -> int:
+    """由 (书名, 页码, 内容哈希) 计算确定性的 INT64 主键"""
+    key = f"{book}\0{page}\0{digest}".encode("utf-8")
+    return int.from_bytes(hashlib.sha256(key).digest()[:8], "big") & (2**63 - 1)
+
+
+def make_page(book: str, page: str, contents: list[str]) -> dict | None:
+    """合并同一逻辑页的内容，过短的页面返回 None"""
+    merged_content = "\n".join(contents)
+    if len(merged_content) <= 10:  # 过滤太短的内容
+        return None
+
+    digest = content_hash(merged_content)
+    return {
+        "id": page_id(book, page, digest),
+        "page": page,
+        "content": merged_content,
+        "book": book,
+        "content_hash": digest,
+    }
+
+
+def iter_pages(records: Iterable[dict], book_name: str) -> Iterator[dict]:
+    """
+    流式按逻辑页码合并内容：逻辑页码变化时立即产出上一页
+    要求同一逻辑页的条目在源文件中连续出现，已结束的页码再次出现时报错
+    (否则同一页码会被拆成两页分别入库)
+    """
+    current_page, contents = None, []
+    seen: set[str] = set()
+
+    for item in records:
+        page = item.get("逻辑页码", "").strip()
+        content = item.get("内容", "").strip()
+
+        # 丢弃逻辑页码为空或内容为空的条目
+        if not page or not content:
+            continue
+
+        if page != current_page:
+            if page in seen:
+                raise ValueError(
+                    f"《{book_name}》逻辑页码 {page} 的条目在源文件中不连续"
+                )
+            seen.add(page)
+            if contents and (merged := make_page(book_name, current_page, contents)):
+                yield merged
+            current_page, contents = page, []
+        contents.append(content)
+
+    if contents and (merged := make_page(book_name, current_page, contents)):
+        yield merged
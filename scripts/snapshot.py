@@ -0,0 +1,155 @@
+"""
+Embedding 快照
+全量导入时把写入的向量 (float16 .npy) 与页面元数据 (JSONL) 按批保存为分片，
+之后可以直接从快照重建集合、更换索引类型或迁移到其他集群，不再调用 Embedding API
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+import numpy as np
+
+# 快照格式版本
+SNAPSHOT_FORMAT = 1
+
+# 与向量一起保存的字段 (与集合 schema 一致)
+METADATA_FIELDS = ("id", "book", "page", "content_hash", "content")
+
+MANIFEST_NAME = "manifest.json"
+
+
+def _read_metadata(path: Path) -> list[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+class SnapshotWriter:
+    """
+    快照写入器
+
+    每批行写入 Milvus 成功后生成一个分片：part-XXXXX.jsonl 逐行保存元数据，
+    part-XXXXX.npy 保存形状为 [行数, 维度] 的 float16 向量，顺序一一对应；
+    .npy 最后通过改名落盘，存在即表示分片完整。断点续传时在同一目录继续编号
+    """
+
+    def __init__(self, path: str | Path, model: str, dimension: int):
+        self.path = Path(path)
+        self.model = model
+        self.dimension = dimension
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        parts = sorted(self.path.glob("part-*.npy"))
+        self._next_part = int(parts[-1].stem.split("-")[1]) + 1 if parts else 0
+
+        manifest_path = self.path / MANIFEST_NAME
+        if manifest_path.exists():
+            self.manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        else:
+            self.manifest = {
+                "format": SNAPSHOT_FORMAT,
+                "model": model,
+                "dimension": dimension,
+                "dtype": "float16",
+                "created_at": time.time(),
+                "rows": 0,
+                "complete": False,
+            }
+            self._save_manifest()
+
+    @staticmethod
+    def exists(path: str | Path) -> bool:
+        """目录中是否已有快照 (续传时判断快照是否从头记录)"""
+        return (Path(path) / MANIFEST_NAME).exists()
+
+    def _save_manifest(self):
+        tmp = self.path / f"{MANIFEST_NAME}.tmp"
+        tmp.write_text(json.dumps(self.manifest, ensure_ascii=False, indent=2))
+        os.replace(tmp, self.path / MANIFEST_NAME)
+
+    def write(self, rows: list[dict]):
+        """保存一批已写入的行 (在插入阶段的工作线程中调用)"""
+        name = f"part-{self._next_part:05d}"
+        vectors = np.asarray([row["embedding"] for row in rows], dtype=np.float16)
+
+        with open(self.path / f"{name}.jsonl", "w", encoding="utf-8") as f:
+            for row in rows:
+                meta = {field: row[field] for field in METADATA_FIELDS}
+                f.write(json.dumps(meta, ensure_ascii=False) + "\n")
+
+        tmp = self.path / f"{name}.npy.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, vectors)
+        os.replace(tmp, self.path / f"{name}.npy")
+        self._next_part += 1
+
+    def wrap(self, write: Callable[[list[dict]], Any]) -> Callable[[list[dict]], None]:
+        """包装写入函数：写入成功后再保存快照分片"""
+
+        def write_with_snapshot(rows: list[dict]):
+            write(rows)
+            self.write(rows)
+
+        return write_with_snapshot
+
+    def finish(self) -> int:
+        """导入完成后标记快照完整，返回快照中的行数"""
+        self.manifest["rows"] = Snapshot(self.path).count()
+        self.manifest["complete"] = True
+        self._save_manifest()
+        print(f"Embedding 快照已保存: {self.path} ({self.manifest['rows']} 条)")
+        return self.manifest["rows"]
+
+
+class Snapshot:
+    """
+    只读快照
+
+    向量以内存映射方式读取，只有实际访问的部分才会载入内存
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        manifest_path = self.path / MANIFEST_NAME
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"快照不存在: {self.path}")
+        self.manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+
+    def iter_parts(self) -> Iterator[tuple[list[dict], np.ndarray]]:
+        """按分片产出 (元数据列表, float16 向量内存映射)"""
+        for npy_path in sorted(self.path.glob("part-*.npy")):
+            metadata = _read_metadata(npy_path.with_suffix(".jsonl"))
+            vectors = np.load(npy_path, mmap_mode="r")
+            if len(metadata) != len(vectors):
+                raise RuntimeError(f"快照分片 {npy_path.name} 的元数据与向量行数不一致")
+            yield metadata, vectors
+
+    def iter_rows(self, batch_size: int) -> Iterator[list[dict]]:
+        """
+        按批产出可直接写入 Milvus 的行 (向量转回 float32)
+
+        续传时中断前的最后一批可能被保存两次，主键重复的行只保留第一次出现
+        """
+        seen: set[int] = set()
+        for metadata, vectors in self.iter_parts():
+            for start in range(0, len(metadata), batch_size):
+                chunk = vectors[start : start + batch_size].astype(np.float32)
+                rows = []
+                for meta, vector in zip(metadata[start : start + batch_size], chunk):
+                    if meta["id"] in seen:
+                        continue
+                    seen.add(meta["id"])
+                    rows.append({**meta, "embedding": vector.tolist()})
+                if rows:
+                    yield rows
+
+    def count(self) -> int:
+        """快照中不重复的行数"""
+        ids: set[int] = set()
+        for npy_path in self.path.glob("part-*.npy"):
+            ids.update(
+                row["id"] for row in _read_metadata(npy_path.with_suffix(".jsonl"))
+            )
+        return len(ids)
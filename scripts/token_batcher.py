@@ -0,0 +1,152 @@
+"""
+按 token 数打包 Embedding 请求
+估算每页的 token 数，在条数上限和 token 上限内尽量填满每次 API 调用，
+超出单条上限的页面在发送前拆分
+"""
+
+import math
+import re
+from typing import Iterable, Iterator
+
+from scripts.ingest import content_hash, page_id
+
+# 中日韩文字与全角标点，Qwen 分词器下大致每字一个 token
+CJK_PATTERN = re.compile(
+    r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]"
+)
+
+# 其他字符 (英文、数字、空白等) 大致每 4 个字符一个 token
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """保守估算文本的 token 数 (宁可高估，避免超出接口限制)"""
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / CHARS_PER_TOKEN)
+
+
+def split_text(text: str, max_tokens: int) -> list[str]:
+    """
+    将文本拆分为不超过 max_tokens 的片段
+    优先在换行处拆分，单行超长时按字符截断 (每个字符至多计 1 个 token)
+    """
+    parts: list[str] = []
+    current: list[str] = []
+    current_tokens = 0
+
+    for line in text.split("\n"):
+        step = max(max_tokens - 1, 1)
+        pieces = [line[i : i + step] for i in range(0, len(line), step)]
+        for piece in pieces or [""]:
+            tokens = estimate_tokens(piece) + 1  # 换行符
+            if current and current_tokens + tokens > max_tokens:
+                parts.append("\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += tokens
+
+    if current:
+        parts.append("\n".join(current))
+    return parts
+
+
+class TokenBatcher:
+    """
+    按条数和估算 token 数打包页面
+
+    每批不超过 max_items 条、max_tokens 个 token；
+    单页超过 max_item_tokens 时拆分为多条 (同一逻辑页码，主键由片段序号和内容哈希决定)
+    """
+
+    def __init__(self, max_items: int, max_tokens: int, max_item_tokens: int):
+        self.max_items = max_items
+        self.max_tokens = max_tokens
+        self.max_item_tokens = min(max_item_tokens, max_tokens)
+
+        self.batches = 0
+        self.items = 0
+        self.tokens = 0
+        self.split_pages = 0
+
+        self._batch: list[dict] = []
+        self._batch_tokens = 0
+
+    def split(self, item: dict) -> list[tuple[dict, int]]:
+        """估算页面 token 数，超长页面拆分后返回 [(页面, token 数), ...]"""
+        tokens = estimate_tokens(item["content"])
+        if tokens <= self.max_item_tokens:
+            return [(item, tokens)]
+
+        self.split_pages += 1
+        parts = []
+        for index, text in enumerate(split_text(item["content"], self.max_item_tokens)):
+            # 片段是长页面的一部分，再短也保留 (只跳过空白片段)
+            if not text.strip():
+                continue
+            digest = content_hash(text)
+            part = {
+                **item,
+                # 主键加入片段序号，同一页中内容相同的片段也不会互相覆盖
+                "id": page_id(item["book"], f"{item['page']}#{index}", digest),
+                "content": text,
+                "content_hash": digest,
+            }
+            parts.append((part, estimate_tokens(text)))
+        print(
+            f"\n页面 {item['page']} 约 {tokens} tokens，"
+            f"超出单条上限 {self.max_item_tokens}，已拆分为 {len(parts)} 条"
+        )
+        return parts
+
+    def split_oversized(self, pages: Iterable[dict]) -> Iterator[dict]:
+        """
+        拆分页面流中的超长页面
+
+        应在断点续传、增量对比等按主键过滤的步骤之前调用，
+        保证过滤时使用的主键与实际写入的主键一致
+        """
+        for page in pages:
+            for item, _ in self.split(page):
+                yield item
+
+    def add(self, page: dict) -> list[list[dict]]:
+        """加入一个页面，返回因此凑满的批次 (仍未拆分的超长页面会在此拆分)"""
+        full: list[list[dict]] = []
+        for item, tokens in self.split(page):
+            if self._batch and (
+                len(self._batch) >= self.max_items
+                or self._batch_tokens + tokens > self.max_tokens
+            ):
+                full.append(self._emit(self._batch, self._batch_tokens))
+                self._batch, self._batch_tokens = [], 0
+            self._batch.append(item)
+            self._batch_tokens += tokens
+        return full
+
+    def flush(self) -> list[list[dict]]:
+        """取出最后一个未满的批次"""
+        if not self._batch:
+            return []
+        batch = self._emit(self._batch, self._batch_tokens)
+        self._batch, self._batch_tokens = [], 0
+        return [batch]
+
+    def _emit(self, batch: list[dict], tokens: int) -> list[dict]:
+        self.batches += 1
+        self.items += len(batch)
+        self.tokens += tokens
+        return batch
+
+    def stats(self) -> dict:
+        """打包统计：批次数、平均每批条数/token 数及相对上限的填充率"""
+        batches = self.batches or 1
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "tokens": self.tokens,
+            "split_pages": self.split_pages,
+            "avg_items": self.items / batches,
+            "avg_tokens": self.tokens / batches,
+            "item_fill": self.items / (batches * self.max_items),
+            "token_fill": self.tokens / (batches * self.max_tokens),
+        }